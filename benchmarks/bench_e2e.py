@@ -0,0 +1,190 @@
+"""End-to-end load test: N concurrent users going generate -> answer -> submit.
+
+Each simulated user follows the same steps as main.py: pick a retrieval
+query from their weakest topics, fetch chunks, assemble the quiz with the
+app's own quiz_assembly.assemble_quiz (question bank first, near-duplicate
+filtering, the shortfall streamed or generated in concurrent batches),
+answer, then score and record the attempt. The model is a local stand-in,
+either in-process (--llm inprocess) or behind a fake chat-completions
+server that the resilient client (llm_client.py) talks to over HTTP
+(--llm server); the server's fault-injection options exercise its
+retries, hedging and model fallback. Bank, history, near-duplicate and response-cache databases
+live in a temporary directory.
+
+    python -m benchmarks.bench_e2e --users 20 --quizzes 3 --latency 0.5 --output e2e.json
+    python -m benchmarks.bench_e2e --llm server --rate-limit-rate 0.2 --timeout-rate 0.05 --llm-timeout 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('GROQ_API_KEY', 'benchmark-placeholder')
+
+from benchmarks.fake_llm import FakeChatModel, FakeChatServer, add_llm_arguments, completions_from_args
+from benchmarks.report import latency_summary, write_report
+from chunk_cache import chunk_key
+from dedup_index import NearDuplicateIndex
+from document_processor import DocumentProcessor
+from history_store import HistoryStore
+from llm_client import ResilientChatClient
+from mcq_generator import GenerationError, MCQGenerator
+from question_bank import QuestionBank
+from quiz_assembly import assemble_quiz
+from response_cache import ResponseCache
+from topic_engine import build_topic_query, score_quiz
+
+
+def build_generator(args, completions, cache_dir: str):
+    server = None
+    if args.llm == 'server':
+        server = FakeChatServer(completions).start()
+        llm = ResilientChatClient(
+            [model.strip() for model in args.models.split(',') if model.strip()],
+            api_key='benchmark-placeholder', base_url=server.base_url, timeout=args.llm_timeout,
+            max_retries=args.max_retries, hedge_after=args.hedge_after,
+            requests_per_minute=args.requests_per_minute, small_quiz_max=args.small_quiz_max,
+            max_connections=max(20, args.users * 2))
+    else:
+        llm = FakeChatModel(completions)
+    generator = MCQGenerator(llm=llm)
+    generator.response_cache = (ResponseCache(os.path.join(cache_dir, 'responses.sqlite3'))
+                                if args.response_cache else None)
+    return generator, server
+
+
+def run_user(user: int, args, processor, generator, bank, history, dedup_index, samples, lock, barrier):
+    rng = random.Random(args.seed * 1000 + user)
+    user_id = f"bench-user-{user}"
+    categories = processor.get_available_categories()
+    served = set()
+    barrier.wait()
+    for _ in range(args.quizzes):
+        category = rng.choice(categories)
+        record = {}
+        quiz_start = time.perf_counter()
+        try:
+            start = time.perf_counter()
+            weakest = history.weakest_topics(user_id, category, limit=3)
+            query = (build_topic_query([item['topic'] for item in weakest]) if weakest
+                     else "Generate questions about core concepts and important topics")
+            chunks = processor.get_relevant_chunks(query, category, top_k=3, mode=args.retrieval_mode)
+            record['retrieval'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            questions, metrics, generation_error = assemble_quiz(
+                bank, generator, dedup_index, category, chunks, query, args.questions, served,
+                f"user:{user_id}", stream=args.stream)
+            # Like the UI: a partial quiz is served, an empty one is an error
+            if not questions:
+                raise GenerationError(generation_error)
+            record['generate'] = time.perf_counter() - start
+            if metrics.get('time_to_first_question') is not None:
+                record['first_question'] = metrics['time_to_first_question']
+
+            time.sleep(rng.uniform(0, 2 * args.think_time))
+            answers = {idx: (q['correct_answer'] if rng.random() < args.accuracy
+                             else (q['correct_answer'] + 1) % len(q['options']))
+                       for idx, q in enumerate(questions)}
+
+            start = time.perf_counter()
+            result = score_quiz(questions, answers, processor.get_topic_model(category))
+            history.record_attempt(user_id, category, questions, answers, result['weak_areas'])
+            history.update_mastery(user_id, category, result['outcomes'])
+            record['submit'] = time.perf_counter() - start
+
+            record['quiz'] = time.perf_counter() - quiz_start
+            record['questions'] = len(questions)
+            record['short'] = len(questions) < args.questions
+        except Exception as e:
+            print(f"User {user} failed a quiz: {e}")
+            record['error'] = True
+        with lock:
+            samples.append(record)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--quizzes', type=int, default=3, help='quizzes per user')
+    parser.add_argument('--questions', type=int, default=10, help='questions per quiz')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean seconds spent answering')
+    parser.add_argument('--accuracy', type=float, default=0.6)
+    parser.add_argument('--llm', choices=['inprocess', 'server'], default='inprocess')
+    parser.add_argument('--stream', action='store_true', help='stream questions like the default UI')
+    parser.add_argument('--retrieval-mode', choices=['keyword', 'semantic'], default='keyword')
+    parser.add_argument('--response-cache', action='store_true')
+    parser.add_argument('--bank-size', type=int, default=0,
+                        help='questions to pre-load into the bank per category')
+    parser.add_argument('--output', help='also write the JSON report here')
+    parser.add_argument('--models', default='llama-3.3-70b-versatile,llama-3.1-8b-instant',
+                        help='--llm server: fallback chain, primary first')
+    parser.add_argument('--llm-timeout', type=float, default=10.0, help='--llm server: seconds per request')
+    parser.add_argument('--max-retries', type=int, default=3, help='--llm server: retries per model')
+    parser.add_argument('--hedge-after', type=float, default=0.0,
+                        help='--llm server: seconds before a hedged second request (0 = off)')
+    parser.add_argument('--requests-per-minute', type=float, default=0.0,
+                        help='--llm server: client rate limit (0 = unlimited)')
+    parser.add_argument('--small-quiz-max', type=int, default=0,
+                        help='--llm server: requests of at most this many questions try the small model first')
+    add_llm_arguments(parser)
+    args = parser.parse_args()
+
+    completions = completions_from_args(args)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        processor = DocumentProcessor()
+        generator, server = build_generator(args, completions, cache_dir)
+        bank = QuestionBank(os.path.join(cache_dir, 'question_bank.sqlite3'))
+        history = HistoryStore(os.path.join(cache_dir, 'history.sqlite3'))
+        dedup_index = NearDuplicateIndex(os.path.join(cache_dir, 'dedup.sqlite3'))
+        if args.bank_size:
+            for category in processor.get_available_categories():
+                chunks = processor.get_document_by_category(category)
+                for i in range(0, args.bank_size, 5):
+                    chunk = chunks[(i // 5) % len(chunks)]
+                    bank.add(category, chunk_key(chunk), generator.generate_mcqs(chunk, 5, use_cache=False))
+        requests_before = completions.requests
+        truncated_before = completions.truncated
+        faults_before = dict(completions.faults)
+
+        samples = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.users)
+        threads = [threading.Thread(target=run_user,
+                                    args=(user, args, processor, generator, bank, history, dedup_index,
+                                          samples, lock, barrier))
+                   for user in range(args.users)]
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_start
+        if server is not None:
+            server.stop()
+
+    completed = [s for s in samples if not s.get('error')]
+    results = {
+        phase: latency_summary([s[phase] for s in completed if phase in s])
+        for phase in ('retrieval', 'generate', 'first_question', 'submit', 'quiz')
+    }
+    results['throughput'] = {
+        'wall_s': wall,
+        'quizzes': len(completed),
+        'quizzes_per_sec': len(completed) / wall if wall else 0.0,
+        'questions_per_sec': sum(s['questions'] for s in completed) / wall if wall else 0.0,
+        'llm_requests': completions.requests - requests_before,
+        'llm_truncated_responses': completions.truncated - truncated_before,
+        'errors': len(samples) - len(completed),
+        'short_quizzes': sum(1 for s in completed if s['short']),
+        'injected_faults': {kind: count - faults_before[kind] for kind, count in completions.faults.items()},
+    }
+    if isinstance(generator.groq, ResilientChatClient):
+        results['llm_client'] = dict(generator.groq.stats)
+    write_report('e2e', vars(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Pages/sec of the streaming PDF ingestion pipeline against worker count.
+
+Builds a large synthetic PDF (default 500 pages) by repeating the pages of
+the bundled aptitude paper, then streams it through iter_pages/iter_chunks
+with different worker counts. With --trace-memory the parent process's
+peak traced Python allocation is reported too (tracemalloc slows the run).
+
+    python -m benchmarks.bench_ingestion --pages 500 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from PyPDF2 import PdfReader, PdfWriter
+
+from ingestion import iter_chunks, iter_pages
+
+SOURCE_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'INFOSYS -APTITUDE-MODEL paper.pdf')
+
+
+def build_pdf(path: str, num_pages: int):
+    source = PdfReader(SOURCE_PDF)
+    writer = PdfWriter()
+    for i in range(num_pages):
+        writer.add_page(source.pages[i % len(source.pages)])
+    with open(path, 'wb') as file:
+        writer.write(file)
+
+
+def run(pdf_path: str, workers: int, chunk_size: int, chunk_overlap: int, trace_memory: bool) -> dict:
+    pages = 0
+
+    def counted():
+        nonlocal pages
+        for page_text in iter_pages(pdf_path, workers=workers):
+            pages += 1
+            yield page_text
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    chunks = sum(1 for _ in iter_chunks(counted(), chunk_size, chunk_overlap))
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        'workers': workers,
+        'pages': pages,
+        'chunks': chunks,
+        'seconds': elapsed,
+        'pages_per_sec': pages / elapsed if elapsed else 0.0,
+        'peak_traced_mb': peak / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--trace-memory', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, 'large.pdf')
+        build_pdf(pdf_path, args.pages)
+        results = [run(pdf_path, workers, 1000, 200, args.trace_memory) for workers in args.workers]
+
+    for result in results:
+        memory = f"  peak {result['peak_traced_mb']:.1f} MB" if args.trace_memory else ""
+        print(f"workers={result['workers']:2d}  {result['pages_per_sec']:7.1f} pages/s  "
+              f"{result['chunks']} chunks{memory}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
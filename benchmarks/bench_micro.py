@@ -0,0 +1,71 @@
+"""Micro-benchmarks for the document pipeline.
+
+Times process_pdf on each bundled PDF, get_document_chunks on the extracted
+text and get_relevant_chunks in keyword and semantic mode, and reports
+p50/p95/p99 per operation. Nothing here calls the model.
+
+    python -m benchmarks.bench_micro --repeat 20 --queries 200 --output micro.json
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('GROQ_API_KEY', 'benchmark-placeholder')
+
+from benchmarks.report import REPO_ROOT, latency_summary, write_report
+from document_processor import DocumentProcessor
+from retrieval import tokenize
+
+PDFS = {
+    'aptitude': os.path.join(REPO_ROOT, 'INFOSYS -APTITUDE-MODEL paper.pdf'),
+    'interview': os.path.join(REPO_ROOT, 'Sample Interview Questions.pdf'),
+}
+
+
+def time_calls(fn, args_list) -> list:
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='runs of process_pdf / get_document_chunks')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the JSON report here')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    processor = DocumentProcessor()
+    results = {}
+
+    for name, path in PDFS.items():
+        if not os.path.exists(path):
+            continue
+        results[f'process_pdf.{name}'] = latency_summary(time_calls(processor.process_pdf, [(path,)] * args.repeat))
+        text = processor.process_pdf(path)
+        results[f'get_document_chunks.{name}'] = latency_summary(
+            time_calls(processor.get_document_chunks, [(text,)] * args.repeat))
+
+    for category in processor.get_available_categories():
+        words = [w for chunk in processor.get_document_by_category(category) for w in tokenize(chunk)]
+        if not words:
+            continue
+        queries = [("Generate questions about " + " ".join(rng.choices(words, k=rng.randint(2, 12))),)
+                   for _ in range(args.queries)]
+        for mode in ('keyword', 'semantic'):
+            # First call builds / loads the vector index; keep it out of the query timings
+            processor.get_relevant_chunks(queries[0][0], category, mode=mode)
+            results[f'get_relevant_chunks.{mode}.{category}'] = latency_summary(time_calls(
+                lambda query: processor.get_relevant_chunks(query, category, top_k=3, mode=mode), queries))
+
+    write_report('micro', vars(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Correctness and speed of the MCQ response parser.
+
+1. Runs the fuzz corpus in benchmarks/data/malformed_responses.json and
+   checks the number of valid questions recovered from each response.
+2. Mutates a clean 30-question response at random (truncation, inserted
+   prose, dropped characters) and checks the parser never raises and
+   never returns an invalid question.
+3. Times the parser against the old fence-stripping + JsonOutputParser
+   path on a clean 30-question response (and the parser alone on a
+   truncated one, which the old path rejected outright).
+
+    python -m benchmarks.bench_parser --mutations 2000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from mcq_parser import parse_mcq_response, validate_question
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'malformed_responses.json')
+
+
+def legacy_parse(response_text: str):
+    """The post-processing generate_mcqs used before mcq_parser"""
+    from langchain_core.output_parsers import JsonOutputParser
+    response_text = response_text.strip()
+    if response_text.startswith('```json'):
+        response_text = response_text.split('```json')[1]
+    if response_text.startswith('```'):
+        response_text = response_text.split('```')[1]
+    if response_text.endswith('```'):
+        response_text = response_text.rsplit('```', 1)[0]
+    response_text = response_text.strip()
+    if not (response_text.startswith('[') and response_text.endswith(']')):
+        raise ValueError("Response is not a valid JSON array")
+    return JsonOutputParser().parse(response_text)
+
+
+def sample_response(num_questions: int = 30) -> str:
+    return json.dumps([
+        {
+            "question": f"A train covers {i * 10} km in {i + 1} hours. What is its speed?",
+            "options": [f"{i} km/h", f"{i * 2} km/h", f"{i * 3} km/h", f"{i * 4} km/h"],
+            "correct_answer": i % 4,
+            "explanation": "Speed is distance divided by time. Apply the formula directly.",
+        }
+        for i in range(1, num_questions + 1)
+    ], indent=4)
+
+
+def run_corpus() -> dict:
+    with open(CORPUS, encoding='utf-8') as file:
+        cases = json.load(file)
+    failures = []
+    for case in cases:
+        questions, _ = parse_mcq_response(case['response'])
+        if len(questions) != case['expected_valid']:
+            failures.append({'name': case['name'], 'expected': case['expected_valid'], 'got': len(questions)})
+    legacy_recovered = 0
+    for case in cases:
+        try:
+            legacy_recovered += len(legacy_parse(case['response']))
+        except Exception:
+            pass
+    return {
+        'cases': len(cases),
+        'failures': failures,
+        'expected_questions': sum(case['expected_valid'] for case in cases),
+        'legacy_questions_returned': legacy_recovered,
+    }
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    kind = rng.choice(['truncate', 'insert_prose', 'drop_chars', 'duplicate_span'])
+    if kind == 'truncate':
+        return text[:rng.randrange(len(text))]
+    if kind == 'insert_prose':
+        at = rng.randrange(len(text))
+        return text[:at] + rng.choice([' Note: see above. ', '\n```\n', ' {oops ', ' ] ', '"']) + text[at:]
+    if kind == 'drop_chars':
+        chars = list(text)
+        for _ in range(rng.randint(1, 5)):
+            del chars[rng.randrange(len(chars))]
+        return ''.join(chars)
+    start = rng.randrange(len(text))
+    return text[:start] + text[start:start + rng.randint(1, 200)] + text[start:]
+
+
+def run_mutations(count: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    base = sample_response()
+    crashes = 0
+    invalid = 0
+    recovered = []
+    for _ in range(count):
+        text = mutate(base, rng)
+        try:
+            questions, _ = parse_mcq_response(text)
+        except Exception:
+            crashes += 1
+            continue
+        invalid += sum(1 for q in questions if validate_question(q)[0] is None)
+        recovered.append(len(questions))
+    return {
+        'mutations': count,
+        'crashes': crashes,
+        'invalid_questions_returned': invalid,
+        'mean_questions_recovered': statistics.fmean(recovered) if recovered else 0.0,
+    }
+
+
+def time_fn(fn, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mutations', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    text = sample_response()
+    result = {
+        'corpus': run_corpus(),
+        'fuzz': run_mutations(args.mutations, args.seed),
+        'timing_us_per_30_question_response': {
+            'mcq_parser': time_fn(parse_mcq_response, text, args.repeat),
+            # Truncated output misses the fast path and goes through the recovering scanner
+            'mcq_parser_truncated': time_fn(parse_mcq_response, text[:-50], args.repeat),
+            'legacy': time_fn(legacy_parse, text, args.repeat),
+        },
+    }
+    print(json.dumps(result, indent=2))
+    if result['corpus']['failures'] or result['fuzz']['crashes'] or result['fuzz']['invalid_questions_returned']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Query latency of BM25 retrieval versus the original linear keyword scan.
+
+Builds a synthetic corpus (default 10,000 chunks of ~1,000 characters) from
+the vocabulary of the bundled PDFs and times the same query mix against the
+inverted index and against the legacy per-chunk scan.
+
+    python -m benchmarks.bench_retrieval --chunks 10000 --queries 200
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import List
+
+from retrieval import BM25Index, STOP_WORDS, tokenize
+
+
+def legacy_relevant_chunks(chunks: List[str], query: str, top_k: int = 3) -> List[str]:
+    """The keyword scan get_relevant_chunks used before the inverted index"""
+    keywords = [word for word in query.lower().split() if word not in STOP_WORDS]
+    chunk_scores = []
+    for i, chunk in enumerate(chunks):
+        chunk_lower = chunk.lower()
+        score = 0
+        matched_keywords = set()
+        for keyword in keywords:
+            occurrences = chunk_lower.count(keyword)
+            if occurrences > 0:
+                matched_keywords.add(keyword)
+                score += occurrences * 2
+                if chunk_lower.startswith(keyword):
+                    score += 3
+                first_sentence = chunk_lower.split('.')[0]
+                if keyword in first_sentence:
+                    score += 2
+        if keywords:
+            score *= (1 + len(matched_keywords) / len(keywords))
+        if score > 0:
+            chunk_scores.append((score, i))
+    chunk_scores.sort(reverse=True)
+    return [chunks[idx] for _, idx in chunk_scores[:top_k]]
+
+
+def load_vocabulary() -> List[str]:
+    try:
+        from document_processor import DocumentProcessor
+        processor = DocumentProcessor()
+        words = [w for chunks in processor.documents.values() for chunk in chunks for w in tokenize(chunk)]
+        if words:
+            return words
+    except Exception as e:
+        print(f"Falling back to synthetic vocabulary: {e}")
+    return [f"term{i}" for i in range(5000)]
+
+
+def build_corpus(vocabulary: List[str], num_chunks: int, rng: random.Random) -> List[str]:
+    corpus = []
+    for _ in range(num_chunks):
+        sentences = []
+        length = 0
+        while length < 1000:
+            sentence = " ".join(rng.choices(vocabulary, k=rng.randint(8, 20))).capitalize() + "."
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        corpus.append(" ".join(sentences))
+    return corpus
+
+
+def time_queries(fn, queries: List[str]) -> List[float]:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings: List[float]) -> dict:
+    timings = sorted(timings)
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': timings[max(0, int(len(timings) * 0.95) - 1)],
+        'mean_ms': statistics.fmean(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--legacy-queries', type=int, default=20,
+                        help='the linear scan is slow; time it on fewer queries')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = load_vocabulary()
+    corpus = build_corpus(vocabulary, args.chunks, rng)
+    queries = ["Generate questions similar to: " + " ".join(rng.choices(vocabulary, k=rng.randint(3, 30)))
+               for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    index = BM25Index(corpus)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    result = {
+        'chunks': args.chunks,
+        'index_terms': len(index.postings),
+        'index_build_ms': build_ms,
+        'bm25': summarize(time_queries(lambda q: index.search(q, 3), queries)),
+        'legacy_scan': summarize(time_queries(lambda q: legacy_relevant_chunks(corpus, q, 3),
+                                              queries[:args.legacy_queries])),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
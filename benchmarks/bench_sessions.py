@@ -0,0 +1,115 @@
+"""Rerun latency and RSS with many concurrent Streamlit-like sessions.
+
+Compares building a fresh DocumentProcessor + MCQGenerator on every rerun
+(the old behaviour of main.py) with the process-wide shared instances from
+shared.py. Each mode runs in its own subprocess so RSS figures don't bleed
+into each other.
+
+    python -m benchmarks.bench_sessions --sessions 50 --reruns 5
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+os.environ.setdefault('GROQ_API_KEY', 'benchmark-placeholder')
+
+
+def current_rss_mb() -> float:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode: str, sessions: int, reruns: int, render_time: float) -> dict:
+    if mode == 'per-rerun':
+        from document_processor import DocumentProcessor
+        from mcq_generator import MCQGenerator
+
+        def rerun():
+            return DocumentProcessor(), MCQGenerator()
+    else:
+        from shared import get_document_processor, get_mcq_generator
+
+        def rerun():
+            return get_document_processor(), get_mcq_generator()
+
+    latencies = []
+    latencies_lock = threading.Lock()
+    peak_rss = [current_rss_mb()]
+    barrier = threading.Barrier(sessions)
+
+    def session():
+        barrier.wait()
+        for _ in range(reruns):
+            start = time.perf_counter()
+            held = rerun()
+            elapsed = time.perf_counter() - start
+            with latencies_lock:
+                latencies.append(elapsed)
+                peak_rss[0] = max(peak_rss[0], current_rss_mb())
+            # Simulate the rest of the script run while the objects are alive
+            time.sleep(render_time)
+            del held
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'sessions': sessions,
+        'reruns_per_session': reruns,
+        'rerun_ms_p50': statistics.median(latencies) * 1000,
+        'rerun_ms_p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'rerun_ms_max': latencies[-1] * 1000,
+        'wall_s': wall,
+        'peak_rss_mb': peak_rss[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--reruns', type=int, default=5)
+    parser.add_argument('--render-time', type=float, default=0.05)
+    parser.add_argument('--mode', choices=['per-rerun', 'shared'])
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.sessions, args.reruns, args.render_time)))
+        return
+
+    results = []
+    for mode in ('per-rerun', 'shared'):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_sessions', '--mode', mode,
+             '--sessions', str(args.sessions), '--reruns', str(args.reruns),
+             '--render-time', str(args.render_time)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    for result in results:
+        print(f"{result['mode']:>10}: rerun p50 {result['rerun_ms_p50']:8.2f} ms  "
+              f"p95 {result['rerun_ms_p95']:8.2f} ms  peak RSS {result['peak_rss_mb']:7.1f} MB")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
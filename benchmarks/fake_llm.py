@@ -0,0 +1,355 @@
+"""Offline stand-ins for the Groq chat model.
+
+FakeChatModel is a drop-in for the ChatGroq instance on MCQGenerator
+(invoke / ainvoke / stream), and FakeChatServer serves the same responses
+over a local OpenAI-style chat-completions endpoint so the real ChatGroq
+client and its HTTP stack can be exercised:
+
+    python -m benchmarks.fake_llm --port 8765 --latency 0.5 --tokens-per-sec 200
+    GROQ_API_BASE=http://127.0.0.1:8765 GROQ_API_KEY=x streamlit run main.py
+
+Both take a first-token latency, a token rate and the fraction of responses
+that come back malformed (prose around the JSON, truncation, broken items).
+The server can also inject faults for the client's retry, hedging and
+fallback paths: 429s with retry-after headers, requests that hang past the
+client timeout, slow responses and models that always answer 503:
+
+    python -m benchmarks.fake_llm --rate-limit-rate 0.2 --timeout-rate 0.05 --slow-rate 0.1 \
+        --unavailable-models llama-3.3-70b-versatile
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# Characters per streamed token, roughly what Llama tokenizers produce for English
+CHARS_PER_TOKEN = 4
+
+_NUM_QUESTIONS_RE = re.compile(r'generate (\d+) multiple choice', re.IGNORECASE)
+
+
+class FakeCompletions:
+    """Builds MCQ responses with configurable timing, malformed-output rate and injected faults"""
+
+    def __init__(self, latency: float = 0.5, tokens_per_sec: float = 250.0,
+                 malformed_rate: float = 0.0, seed: int = 0, rate_limit_rate: float = 0.0,
+                 timeout_rate: float = 0.0, slow_rate: float = 0.0, slow_factor: float = 10.0,
+                 retry_after: float = 1.0, hang_seconds: float = 30.0,
+                 unavailable_models: Sequence[str] = ()):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.malformed_rate = malformed_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.retry_after = retry_after
+        self.hang_seconds = hang_seconds
+        self.unavailable_models = set(unavailable_models)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests = 0
+        self.truncated = 0
+        self.faults = {'rate_limited': 0, 'timeout': 0, 'slow': 0, 'unavailable': 0}
+
+    def fault(self, model: str) -> Optional[str]:
+        """The fault to inject into one request, if any"""
+        if model in self.unavailable_models:
+            kind = 'unavailable'
+        else:
+            with self._rng_lock:
+                roll = self._rng.random()
+            kind = None
+            for name, rate in (('rate_limited', self.rate_limit_rate), ('timeout', self.timeout_rate),
+                               ('slow', self.slow_rate)):
+                if roll < rate:
+                    kind = name
+                    break
+                roll -= rate
+        if kind is not None:
+            with self._rng_lock:
+                self.faults[kind] += 1
+        return kind
+
+    @staticmethod
+    def requested_questions(messages: List[Dict]) -> int:
+        for message in reversed(messages):
+            match = _NUM_QUESTIONS_RE.search(message.get('content', ''))
+            if match:
+                return int(match.group(1))
+        return 5
+
+    def response_text(self, messages: List[Dict]) -> str:
+        num_questions = self.requested_questions(messages)
+        with self._rng_lock:
+            self.requests += 1
+            rng = random.Random(self._rng.random())
+        questions = []
+        for _ in range(num_questions):
+            a, b = rng.randint(2, 99), rng.randint(2, 99)
+            answer = rng.randrange(4)
+            options = [str(a * b + (i - answer) * rng.randint(1, 9)) for i in range(4)]
+            options[answer] = str(a * b)
+            questions.append({
+                "question": f"What is {a} multiplied by {b}? (variant {rng.getrandbits(32):08x})",
+                "options": options,
+                "correct_answer": answer,
+                "explanation": f"Multiplication. {a} x {b} = {a * b}.",
+            })
+        text = json.dumps(questions, indent=4)
+        if rng.random() < self.malformed_rate:
+            text = self._malform(text, questions, rng)
+        return text
+
+    @staticmethod
+    def _malform(text: str, questions: List[Dict], rng: random.Random) -> str:
+        kind = rng.choice(['prose', 'fenced', 'truncated', 'bad_item'])
+        if kind == 'prose':
+            return "Here are your questions:\n" + text + "\nLet me know if you need more."
+        if kind == 'fenced':
+            return "```json\n" + text + "\n```"
+        if kind == 'truncated':
+            return text[:rng.randrange(len(text) // 2, len(text))]
+        broken = [dict(q) for q in questions]
+        broken[rng.randrange(len(broken))]['options'] = ["only", "three", "options"]
+        return json.dumps(broken, indent=4)
+
+    def limit(self, text: str, max_tokens) -> str:
+        """Cut text at max_tokens like a model hitting its output limit"""
+        if max_tokens and len(text) > max_tokens * CHARS_PER_TOKEN:
+            with self._rng_lock:
+                self.truncated += 1
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return text
+
+    def tokens(self, text: str) -> List[str]:
+        return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+    def first_token_latency(self, slow: bool = False) -> float:
+        return self.latency * (self.slow_factor if slow else 1)
+
+    def generation_time(self, text: str, slow: bool = False) -> float:
+        return self.first_token_latency(slow) + len(self.tokens(text)) / self.tokens_per_sec
+
+
+def _as_dicts(messages) -> List[Dict]:
+    return [m if isinstance(m, dict) else {'role': getattr(m, 'type', ''), 'content': m.content}
+            for m in messages]
+
+
+class FakeChatModel:
+    """In-process replacement for ChatGroq with the attributes MCQGenerator reads"""
+
+    def __init__(self, completions: FakeCompletions, model_name: str = "fake-llama",
+                 temperature: float = 0.5, max_tokens: int = 4096):
+        self.completions = completions
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def _text(self, messages, kwargs) -> str:
+        text = self.completions.response_text(_as_dicts(messages))
+        return self.completions.limit(text, kwargs.get('max_tokens', self.max_tokens))
+
+    def invoke(self, messages, **kwargs) -> AIMessage:
+        text = self._text(messages, kwargs)
+        time.sleep(self.completions.generation_time(text))
+        return AIMessage(content=text)
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        text = self._text(messages, kwargs)
+        await asyncio.sleep(self.completions.generation_time(text))
+        return AIMessage(content=text)
+
+    def stream(self, messages, **kwargs) -> Iterator[AIMessageChunk]:
+        text = self._text(messages, kwargs)
+        time.sleep(self.completions.latency)
+        delay = 1 / self.completions.tokens_per_sec
+        for token in self.completions.tokens(text):
+            time.sleep(delay)
+            yield AIMessageChunk(content=token)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    completions: FakeCompletions = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            # The client closed an idle keep-alive connection
+            pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _inject(self, fault: str) -> bool:
+        """Answer with the injected fault; False if the request should go ahead (slowly)"""
+        if fault == 'rate_limited':
+            retry_after = self.completions.retry_after
+            self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests',
+                                            'code': 'rate_limit_exceeded'}},
+                            {'retry-after': f"{retry_after:g}", 'x-ratelimit-remaining-requests': '0',
+                             'x-ratelimit-reset-requests': f"{retry_after:g}s"})
+            return True
+        if fault == 'unavailable':
+            self._send_json(503, {'error': {'message': 'Service unavailable', 'type': 'internal_server_error'}})
+            return True
+        if fault == 'timeout':
+            # Long enough for the client to give up; the late answer goes nowhere
+            time.sleep(self.completions.hang_seconds)
+            self._send_json(504, {'error': {'message': 'Gateway timeout', 'type': 'internal_server_error'}})
+            return True
+        return False
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        model = body.get('model', 'fake-llama')
+        fault = self.completions.fault(model)
+        try:
+            if self._inject(fault):
+                return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        slow = fault == 'slow'
+        text = self.completions.limit(self.completions.response_text(body.get('messages', [])),
+                                      body.get('max_tokens') or body.get('max_completion_tokens'))
+        created = int(time.time())
+        if body.get('stream'):
+            try:
+                self._stream(text, model, created, slow)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            return
+
+        time.sleep(self.completions.generation_time(text, slow))
+        completion_tokens = len(self.completions.tokens(text))
+        payload = {
+            'id': f'chatcmpl-{created}',
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': completion_tokens,
+                      'total_tokens': completion_tokens},
+        }
+        try:
+            self._send_json(200, payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout) or took a hedged answer instead
+            pass
+
+    def _stream(self, text: str, model: str, created: int, slow: bool = False):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def event(delta: Dict, finish_reason=None):
+            data = json.dumps({
+                'id': f'chatcmpl-{created}', 'object': 'chat.completion.chunk', 'created': created,
+                'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            })
+            chunk = f"data: {data}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+            self.wfile.flush()
+
+        time.sleep(self.completions.first_token_latency(slow))
+        event({'role': 'assistant', 'content': ''})
+        delay = 1 / self.completions.tokens_per_sec
+        for token in self.completions.tokens(text):
+            time.sleep(delay)
+            event({'content': token})
+        event({}, 'stop')
+        done = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(done):x}\r\n".encode('ascii') + done + b"\r\n0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeChatServer:
+    """Local chat-completions endpoint; use ``base_url`` as GROQ_API_BASE"""
+
+    def __init__(self, completions: FakeCompletions, host: str = '127.0.0.1', port: int = 0):
+        handler = type('FakeChatHandler', (_Handler,), {'completions': completions})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeChatServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_llm_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds to first token')
+    parser.add_argument('--tokens-per-sec', type=float, default=250.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of requests answered 429')
+    parser.add_argument('--timeout-rate', type=float, default=0.0,
+                        help='fraction of requests that hang for --hang-seconds')
+    parser.add_argument('--slow-rate', type=float, default=0.0,
+                        help='fraction of requests with --slow-factor times the latency')
+    parser.add_argument('--slow-factor', type=float, default=10.0)
+    parser.add_argument('--retry-after', type=float, default=1.0, help='retry-after seconds sent with 429s')
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--unavailable-models', default='', help='comma-separated models that always answer 503')
+
+
+def completions_from_args(args) -> FakeCompletions:
+    return FakeCompletions(args.latency, args.tokens_per_sec, args.malformed_rate, args.seed,
+                           rate_limit_rate=args.rate_limit_rate, timeout_rate=args.timeout_rate,
+                           slow_rate=args.slow_rate, slow_factor=args.slow_factor,
+                           retry_after=args.retry_after, hang_seconds=args.hang_seconds,
+                           unavailable_models=[m.strip() for m in args.unavailable_models.split(',') if m.strip()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Groq chat-completions endpoint")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_llm_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeChatServer(completions_from_args(args), args.host, args.port)
+    print(f"Fake chat-completions server on {server.base_url} (set GROQ_API_BASE to this)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Percentile summaries and JSON reports shared by the benchmarks.
+
+Reports carry the git commit and host details so runs from different
+commits can be compared:
+
+    python -m benchmarks.report before.json after.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """Count, mean and p50/p95/p99/max in milliseconds for a list of durations in seconds"""
+    ordered = sorted(seconds)
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p95_ms': percentile(ordered, 0.95) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+
+def environment() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def write_report(benchmark: str, config: Dict, results: Dict, output: Optional[str] = None) -> Dict:
+    """Print the report as JSON and optionally save it to output"""
+    report = {'benchmark': benchmark, 'environment': environment(), 'config': config, 'results': results}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(text + "\n")
+    return report
+
+
+def _flatten(value, prefix: str = '') -> Dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare(before: Dict, after: Dict) -> List[Dict]:
+    """Relative change of every numeric result present in both reports"""
+    old = _flatten(before.get('results', {}))
+    new = _flatten(after.get('results', {}))
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else None
+        rows.append({'metric': key, 'before': old[key], 'after': new[key], 'change_pct': change})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+
+    with open(args.before, encoding='utf-8') as file:
+        before = json.load(file)
+    with open(args.after, encoding='utf-8') as file:
+        after = json.load(file)
+    if before.get('benchmark') != after.get('benchmark'):
+        print(f"Warning: comparing {before.get('benchmark')} with {after.get('benchmark')}", file=sys.stderr)
+    print(f"{before['environment'].get('commit')} -> {after['environment'].get('commit')}")
+    for row in compare(before, after):
+        change = f"{row['change_pct']:+7.1f}%" if row['change_pct'] is not None else "    n/a"
+        print(f"{row['metric']:<50} {row['before']:>12.3f} {row['after']:>12.3f} {change}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+from typing import List, Optional
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Bump whenever the on-disk layout or the chunking logic changes so that
+# stale entries are ignored instead of being served.
+CACHE_VERSION = 3
+
+
+def chunk_key(chunk: str) -> str:
+    """Stable identifier for a source chunk, independent of its position"""
+    return hashlib.sha1(chunk.encode('utf-8')).hexdigest()
+
+
+def file_content_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_pickle_dump(obj, path: str):
+    """Pickle obj to path via a temp file + rename so readers never see a partial file"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.pkl')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            pickle.dump(obj, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ChunkCache:
+    """Versioned on-disk store of document chunks keyed by source file identity.
+
+    Each source PDF gets its own entry recording its path, size, mtime and
+    content hash together with the chunking parameters. A lookup whose size
+    and mtime still match is served without reading the PDF; if only the
+    stat information changed, the content hash decides whether the entry is
+    still valid. Entries are written atomically, so several worker processes
+    can share one cache directory.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = os.path.join(cache_dir, 'chunks')
+
+    def _entry_path(self, pdf_path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(pdf_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _read_entry(self, pdf_path: str) -> Optional[dict]:
+        try:
+            with open(self._entry_path(pdf_path), 'rb') as file:
+                entry = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION:
+            return None
+        return entry
+
+    def get(self, pdf_path: str, chunk_size: int, chunk_overlap: int) -> Optional[List[str]]:
+        """Return cached chunks for pdf_path, or None if missing or stale"""
+        entry = self._read_entry(pdf_path)
+        if entry is None:
+            return None
+        if entry['path'] != os.path.abspath(pdf_path):
+            return None
+        if entry['chunk_size'] != chunk_size or entry['chunk_overlap'] != chunk_overlap:
+            return None
+
+        try:
+            stat = os.stat(pdf_path)
+        except OSError:
+            return None
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry['chunks']
+
+        # The file was touched or copied; fall back to comparing contents
+        if entry['size'] != stat.st_size or entry['sha256'] != file_content_hash(pdf_path):
+            return None
+        entry['mtime'] = stat.st_mtime_ns
+        atomic_pickle_dump(entry, self._entry_path(pdf_path))
+        return entry['chunks']
+
+    def put(self, pdf_path: str, chunk_size: int, chunk_overlap: int, chunks: List[str]):
+        """Store chunks for pdf_path together with its current identity"""
+        stat = os.stat(pdf_path)
+        entry = {
+            'version': CACHE_VERSION,
+            'path': os.path.abspath(pdf_path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'sha256': file_content_hash(pdf_path),
+            'chunk_size': chunk_size,
+            'chunk_overlap': chunk_overlap,
+            'chunks': chunks,
+        }
+        atomic_pickle_dump(entry, self._entry_path(pdf_path))
+
+    def clear(self):
+        """Remove every cached entry"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,110 @@
+from typing import List, Optional, Tuple
+import re
+from retrieval import query_terms, tokenize
+
+try:
+    import tiktoken
+    # Llama 3's tokenizer is tiktoken-based; cl100k_base counts within a few percent
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _ENCODING = None
+
+_PIECE_RE = re.compile(r"[A-Za-z]+|[0-9]+|[^\sA-Za-z0-9]")
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9("\'])')
+# Fragments shorter than this ("1.", "Ans.") are glued to the following sentence
+MIN_SENTENCE_CHARS = 25
+
+
+def count_tokens(text: str) -> int:
+    """Number of model tokens in text, estimated locally when tiktoken is not installed"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece[0].isalpha():
+            # Common short words are one token; longer ones split every ~4 characters
+            tokens += 1 + max(0, len(piece) - 3) // 4
+        elif piece[0].isdigit():
+            # Numbers are split into groups of up to three digits
+            tokens += (len(piece) + 2) // 3
+        else:
+            tokens += 1
+    return tokens
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    pending = ''
+    for sentence in _SENTENCE_END_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        pending = f"{pending} {sentence}" if pending else sentence
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            sentences.append(pending)
+            pending = ''
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+def _sentence_key(sentence: str) -> str:
+    return ' '.join(tokenize(sentence))
+
+
+def build_context(chunks: List[str], query: str = "", token_budget: Optional[int] = None) -> str:
+    """Join retrieved chunks into one reference text of at most token_budget tokens.
+
+    Sentences repeated across chunks (the chunk_overlap windows, or the same
+    passage retrieved twice) are kept once. If the result is still over
+    budget, the sentences that share the fewest terms with the query are
+    dropped, favouring higher-ranked chunks and each chunk's opening
+    sentence; the survivors keep their original order.
+    """
+    terms = set(query_terms(query))
+    seen = set()
+    # (chunk index, sentence, tokens, score)
+    sentences: List[Tuple[int, str, int, float]] = []
+    for rank, chunk in enumerate(chunks):
+        for position, sentence in enumerate(split_sentences(chunk)):
+            key = _sentence_key(sentence)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            words = set(tokenize(sentence))
+            score = 2.0 * len(terms & words) + 1.0 / (rank + 1) + (0.5 if position == 0 else 0.0)
+            sentences.append((rank, sentence, count_tokens(sentence) + 1, score))
+
+    if token_budget is not None:
+        total = sum(tokens for _, _, tokens, _ in sentences)
+        if total > token_budget:
+            keep = set()
+            used = 0
+            order = sorted(range(len(sentences)), key=lambda i: (-sentences[i][3], i))
+            for i in order:
+                tokens = sentences[i][2]
+                if used + tokens <= token_budget:
+                    keep.add(i)
+                    used += tokens
+            if not keep and order:
+                # Not even the best sentence fits; keep its opening words
+                rank, sentence, _, score = sentences[order[0]]
+                words = sentence.split()
+                while len(words) > 1 and count_tokens(' '.join(words)) > token_budget:
+                    words = words[:len(words) * 3 // 4]
+                sentences[order[0]] = (rank, ' '.join(words), token_budget, score)
+                keep.add(order[0])
+            sentences = [sentence for i, sentence in enumerate(sentences) if i in keep]
+
+    # One paragraph per source chunk
+    paragraphs: List[List[str]] = []
+    last_rank = None
+    for rank, sentence, _, _ in sentences:
+        if rank != last_rank:
+            paragraphs.append([])
+            last_rank = rank
+        paragraphs[-1].append(sentence)
+    return "\n\n".join(" ".join(paragraph) for paragraph in paragraphs)
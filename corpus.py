@@ -0,0 +1,296 @@
+"""Incremental PDF corpus with one index segment per document.
+
+CorpusManager tracks the PDFs under a set of source directories. Each
+document becomes a Segment holding its chunks and their BM25 index;
+``sync()`` stats every file and re-chunks only new or changed ones (the
+chunk cache makes a restart cheap), so adding a paper costs one PDF parse,
+not a rebuild of the corpus. A deleted file leaves a Tombstone recording
+its category and chunk keys, and a changed one a Tombstone of the chunks
+it no longer has. Both are persisted in ``state_path`` so changes made
+while the app was down are still reported and dependent stores (the
+question bank) can drop what was generated from those chunks.
+
+A document's category comes from the ``corpus.json`` manifest at the root
+of its source directory, else from its top-level folder, else from its
+file name. The manifest can also give categories display labels:
+
+    {
+        "categories": {"aptitude": {"label": "Aptitude Questions"}},
+        "documents": {"INFOSYS -APTITUDE-MODEL paper.pdf": {"category": "aptitude"}}
+    }
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from chunk_cache import atomic_pickle_dump, chunk_key
+from retrieval import BM25Index
+
+MANIFEST_NAME = 'corpus.json'
+# Bump whenever the state file layout changes
+STATE_VERSION = 1
+
+
+def category_slug(name: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+def default_label(category: str) -> str:
+    return category.replace('_', ' ').title()
+
+
+class Segment:
+    """One document's chunks and BM25 index, replaced whole when the file changes"""
+
+    __slots__ = ('path', 'category', 'fingerprint', 'chunks', 'index')
+
+    def __init__(self, path: str, category: str, fingerprint: Optional[Tuple[int, int]], chunks: List[str]):
+        self.path = path
+        self.category = category
+        # (size, mtime_ns) of the file; None for documents that were not read from a source directory
+        self.fingerprint = fingerprint
+        self.chunks = chunks
+        self.index = BM25Index(chunks)
+
+
+class Tombstone:
+    """Chunks gone from a category: a deleted document's, or those a changed document dropped"""
+
+    __slots__ = ('path', 'category', 'chunk_keys', 'deleted')
+
+    def __init__(self, path: str, category: str, chunk_keys: List[str], deleted: float):
+        self.path = path
+        self.category = category
+        self.chunk_keys = chunk_keys
+        self.deleted = deleted
+
+
+class CorpusManager:
+    """Per-document segments of the PDFs under the source directories.
+
+    ``load_chunks(path)`` turns one PDF into chunks (DocumentProcessor
+    passes its cached loader). Segments are only ever replaced, never
+    mutated, so a published category index built from them stays valid
+    while a sync runs. Tombstones are kept for ``tombstone_ttl`` seconds.
+    """
+
+    def __init__(self, load_chunks: Callable[[str], List[str]], state_path: Optional[str] = None,
+                 tombstone_ttl: float = 30 * 24 * 3600):
+        self.load_chunks = load_chunks
+        self.state_path = state_path
+        self.tombstone_ttl = tombstone_ttl
+        # (directory, recursive)
+        self.sources: List[Tuple[str, bool]] = []
+        self.segments: Dict[str, Segment] = {}
+        self.tombstones: Dict[str, Tombstone] = {}
+        # Chunks dropped by documents that changed (or moved category) but still exist
+        self.dropped: List[Tombstone] = []
+        self.labels: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        # Documents recorded by the previous run, tombstoned if they are gone
+        self._known: Dict[str, Dict] = {}
+        self._load_state()
+
+    def add_source(self, directory: str, recursive: bool = True):
+        directory = os.path.abspath(directory)
+        with self._lock:
+            if all(source != directory for source, _ in self.sources):
+                self.sources.append((directory, recursive))
+
+    def _tracked(self, path: str) -> bool:
+        for directory, recursive in self.sources:
+            if os.path.dirname(path) == directory or (recursive and path.startswith(directory + os.sep)):
+                return True
+        return False
+
+    @staticmethod
+    def _read_manifest(directory: str) -> Dict:
+        path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(path, encoding='utf-8') as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Error reading corpus manifest {path}: {e}")
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+
+    def scan(self) -> Tuple[Dict[str, Tuple[str, Tuple[int, int]]], Dict[str, str]]:
+        """Stat every PDF under the sources.
+
+        Returns {path: (category, (size, mtime_ns))} and the category labels
+        from the manifests.
+        """
+        found: Dict[str, Tuple[str, Tuple[int, int]]] = {}
+        labels: Dict[str, str] = {}
+        for directory, recursive in self.sources:
+            manifest = self._read_manifest(directory)
+            for category, entry in (manifest.get('categories') or {}).items():
+                if isinstance(entry, dict) and entry.get('label'):
+                    labels[category_slug(category)] = str(entry['label'])
+            documents = manifest.get('documents') or {}
+            for root, dirs, files in os.walk(directory):
+                # Hidden folders (.git, editor state) never hold corpus documents
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.')) if recursive else []
+                for name in sorted(files):
+                    if not name.lower().endswith('.pdf'):
+                        continue
+                    path = os.path.join(root, name)
+                    relative = os.path.relpath(path, directory).replace(os.sep, '/')
+                    entry = documents.get(relative)
+                    if isinstance(entry, dict) and entry.get('category'):
+                        category = str(entry['category'])
+                    elif '/' in relative:
+                        category = relative.split('/', 1)[0]
+                    else:
+                        category = os.path.splitext(name)[0]
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    found[path] = (category_slug(category), (stat.st_size, stat.st_mtime_ns))
+        return found, labels
+
+    @staticmethod
+    def _dropped_chunks(path: str, old_category: str, old_keys: List[str], new_category: str,
+                        new_chunks: List[str], now: float) -> Optional[Tombstone]:
+        """Tombstone of the old chunks a changed document no longer has in their category"""
+        kept = {chunk_key(c) for c in new_chunks} if new_category == old_category else set()
+        keys = [key for key in old_keys if key not in kept]
+        return Tombstone(path, old_category, keys, now) if keys else None
+
+    def sync(self) -> Dict:
+        """Bring the segments in line with the files on disk.
+
+        Returns the paths ``added`` and ``updated``, the ``removed``
+        tombstones, the ``dropped`` tombstones of chunks that changed
+        documents no longer have and the ``categories`` whose documents
+        changed.
+        """
+        with self._lock:
+            found, labels = self.scan()
+            added, updated, removed, dropped = [], [], [], []
+            changed = set()
+            now = time.time()
+            for path, (category, fingerprint) in found.items():
+                segment = self.segments.get(path)
+                if segment is not None and segment.fingerprint == fingerprint and segment.category == category:
+                    continue
+                chunks = self.load_chunks(path)
+                if not chunks:
+                    # Unreadable (or still being copied); keep what was there and look again next sync
+                    continue
+                self.tombstones.pop(path, None)
+                if segment is not None and segment.category == category and segment.chunks == chunks:
+                    # Touched but not changed
+                    segment.fingerprint = fingerprint
+                    continue
+                self.segments[path] = Segment(path, category, fingerprint, chunks)
+                changed.add(category)
+                if segment is None:
+                    added.append(path)
+                else:
+                    changed.add(segment.category)
+                    updated.append(path)
+                    stale = self._dropped_chunks(path, segment.category, [chunk_key(c) for c in segment.chunks],
+                                                 category, chunks, now)
+                    if stale is not None:
+                        dropped.append(stale)
+
+            for path in [p for p, s in self.segments.items() if s.fingerprint is not None and p not in found]:
+                segment = self.segments.pop(path)
+                tombstone = Tombstone(path, segment.category, [chunk_key(c) for c in segment.chunks], now)
+                self.tombstones[path] = tombstone
+                removed.append(tombstone)
+                changed.add(segment.category)
+            for path in [p for p in self._known if self._tracked(p)]:
+                segment = self.segments.get(path)
+                if path in found and segment is None:
+                    # Not readable yet; compared once it is
+                    continue
+                entry = self._known.pop(path)
+                if path not in found:
+                    tombstone = Tombstone(path, entry['category'], entry['chunk_keys'], now)
+                    self.tombstones[path] = tombstone
+                    removed.append(tombstone)
+                else:
+                    # Changed while the app was down
+                    stale = self._dropped_chunks(path, entry['category'], entry['chunk_keys'],
+                                                 segment.category, segment.chunks, now)
+                    if stale is not None:
+                        dropped.append(stale)
+            self.dropped.extend(dropped)
+            for path in [p for p, t in self.tombstones.items() if now - t.deleted > self.tombstone_ttl]:
+                del self.tombstones[path]
+            self.dropped = [t for t in self.dropped if now - t.deleted <= self.tombstone_ttl]
+
+            labels_changed = labels != self.labels
+            self.labels = labels
+            if added or updated or removed or dropped or labels_changed:
+                self._save_state()
+        for path in added:
+            print(f"Corpus: added {os.path.basename(path)} to {self.segments[path].category}")
+        for path in updated:
+            print(f"Corpus: re-indexed {os.path.basename(path)}")
+        for tombstone in removed:
+            print(f"Corpus: removed {os.path.basename(tombstone.path)} from {tombstone.category}")
+        for tombstone in dropped:
+            print(f"Corpus: {os.path.basename(tombstone.path)} dropped {len(tombstone.chunk_keys)} chunks "
+                  f"from {tombstone.category}")
+        return {'added': added, 'updated': updated, 'removed': removed, 'dropped': dropped,
+                'categories': sorted(changed), 'labels_changed': labels_changed}
+
+    def add_document(self, name: str, category: str, chunks: List[str]) -> Segment:
+        """Add chunks that did not come from a source directory (e.g. an upload) as their own segment"""
+        segment = Segment(f"upload:{name}", category_slug(category) or category, None, chunks)
+        with self._lock:
+            self.segments[segment.path] = segment
+        return segment
+
+    def segments_by_category(self) -> Dict[str, List[Segment]]:
+        """Live segments grouped by category, in a stable (path) order"""
+        with self._lock:
+            segments = sorted(self.segments.values(), key=lambda segment: segment.path)
+        grouped: Dict[str, List[Segment]] = {}
+        for segment in segments:
+            grouped.setdefault(segment.category, []).append(segment)
+        return grouped
+
+    def label(self, category: str) -> str:
+        return self.labels.get(category) or default_label(category)
+
+    def _load_state(self):
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path, 'rb') as file:
+                state = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return
+        if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+            return
+        self._known = state['documents']
+        self.tombstones = {path: Tombstone(path, *fields) for path, fields in state['tombstones'].items()}
+        self.dropped = [Tombstone(*fields) for fields in state.get('dropped', [])]
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        documents = dict(self._known)
+        documents.update({
+            path: {'category': segment.category, 'chunk_keys': [chunk_key(c) for c in segment.chunks]}
+            for path, segment in self.segments.items() if segment.fingerprint is not None
+        })
+        try:
+            atomic_pickle_dump({
+                'version': STATE_VERSION,
+                'documents': documents,
+                'tombstones': {path: (t.category, t.chunk_keys, t.deleted) for path, t in self.tombstones.items()},
+                'dropped': [(t.path, t.category, t.chunk_keys, t.deleted) for t in self.dropped],
+            }, self.state_path)
+        except OSError as e:
+            print(f"Error writing corpus state {self.state_path}: {e}")
@@ -0,0 +1,234 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+from retrieval import tokenize
+
+DEFAULT_DEDUP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'dedup.sqlite3')
+
+# Words per shingle
+SHINGLE_SIZE = 3
+_PRIME = (1 << 31) - 1
+_permutations: Dict[int, tuple] = {}
+
+
+def _hash_params(num_perm: int):
+    params = _permutations.get(num_perm)
+    if params is None:
+        rng = np.random.default_rng(1)
+        a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        params = _permutations[num_perm] = (a, b)
+    return params
+
+
+def shingles(text: str) -> set:
+    """Word 3-grams of the normalised text (the whole text if it is shorter)"""
+    words = tokenize(text)
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str, num_perm: int = 64) -> np.ndarray:
+    """MinHash signature of the text's shingles; equal slots estimate Jaccard similarity"""
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) % _PRIME for s in shingles(text)), dtype=np.uint64)
+    if hashes.size == 0:
+        return np.full(num_perm, _PRIME, dtype=np.uint32)
+    a, b = _hash_params(num_perm)
+    return ((a * hashes + b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    return float(np.mean(first == second))
+
+
+def question_text(question: Dict) -> str:
+    return str(question.get('question', '')) if isinstance(question, dict) else ''
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash/LSH index of question texts, partitioned into scopes.
+
+    A scope is the set of questions one check is made against, e.g.
+    ``user:<id>`` for everything served to a user or ``bank:<category>``
+    for a category of the question bank. Signatures are split into
+    ``bands`` bands whose hashes are indexed in SQLite, so a lookup reads
+    only the few signatures sharing a band with the new question; those are
+    confirmed against ``threshold`` (estimated Jaccard similarity of word
+    3-grams). Each scope keeps at most ``max_per_scope`` signatures and the
+    whole index at most ``max_signatures`` across all scopes (every
+    anonymous visitor has a scope of their own), oldest evicted first, so
+    the database stays bounded however many users come and go.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DEDUP_PATH, num_perm: int = 64, bands: int = 16,
+                 threshold: float = 0.7, max_per_scope: int = 10000, max_signatures: int = 200000):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.db_path = db_path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.max_per_scope = max_per_scope
+        self.max_signatures = max_signatures
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                num_perm INTEGER NOT NULL,
+                signature BLOB NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS signatures_scope ON signatures (scope, id);
+
+            CREATE TABLE IF NOT EXISTS bands (
+                scope TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                signature_id INTEGER NOT NULL REFERENCES signatures (id)
+            );
+            CREATE INDEX IF NOT EXISTS bands_bucket ON bands (scope, bucket);
+            CREATE INDEX IF NOT EXISTS bands_signature ON bands (signature_id);
+        """)
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def signature(self, question: Dict) -> np.ndarray:
+        return minhash_signature(question_text(question), self.num_perm)
+
+    def _buckets(self, signature: np.ndarray) -> List[int]:
+        buckets = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                                     digest_size=8, person=band.to_bytes(2, 'little')).digest()
+            buckets.append(int.from_bytes(digest, 'little', signed=True))
+        return buckets
+
+    def find(self, signature: np.ndarray, scopes: Sequence[str]) -> Optional[int]:
+        """Id of a stored signature in scopes at least threshold-similar to signature, if any"""
+        if not scopes:
+            return None
+        buckets = self._buckets(signature)
+        scope_marks = ','.join('?' * len(scopes))
+        bucket_marks = ','.join('?' * len(buckets))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT s.id, s.signature FROM bands b JOIN signatures s ON s.id = b.signature_id "
+                f"WHERE b.scope IN ({scope_marks}) AND b.bucket IN ({bucket_marks}) AND s.num_perm = ?",
+                (*scopes, *buckets, self.num_perm)).fetchall()
+        for signature_id, blob in rows:
+            if similarity(signature, np.frombuffer(blob, dtype=np.uint32)) >= self.threshold:
+                return signature_id
+        return None
+
+    def add(self, questions: Iterable[Dict], scope: str) -> int:
+        """Index questions under scope, evicting the oldest entries beyond max_per_scope and max_signatures"""
+        signatures = [self.signature(q) for q in questions if question_text(q)]
+        return self.add_signatures(signatures, scope)
+
+    def add_signatures(self, signatures: List[np.ndarray], scope: str) -> int:
+        if not signatures:
+            return 0
+        now = time.time()
+        with self._lock, self._conn:
+            for signature in signatures:
+                signature_id = self._conn.execute(
+                    "INSERT INTO signatures (scope, num_perm, signature, created) VALUES (?, ?, ?, ?)",
+                    (scope, self.num_perm, signature.astype(np.uint32).tobytes(), now)).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO bands (scope, bucket, signature_id) VALUES (?, ?, ?)",
+                    [(scope, bucket, signature_id) for bucket in set(self._buckets(signature))])
+            self._total += len(signatures)
+            self._evict(scope)
+        return len(signatures)
+
+    def _evict(self, scope: str):
+        count = self._conn.execute("SELECT COUNT(*) FROM signatures WHERE scope = ?", (scope,)).fetchone()[0]
+        excess = count - self.max_per_scope
+        if excess > 0:
+            self._delete([row[0] for row in self._conn.execute(
+                "SELECT id FROM signatures WHERE scope = ? ORDER BY id LIMIT ?", (scope, excess))])
+        if self._total > self.max_signatures:
+            # Another process may have evicted too; count before deleting
+            self._total = self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+        # Ids grow with insertion, so the lowest are the oldest of any scope
+        excess = self._total - self.max_signatures
+        if excess > 0:
+            self._delete([row[0] for row in self._conn.execute(
+                "SELECT id FROM signatures ORDER BY id LIMIT ?", (excess,))])
+
+    def _delete(self, signature_ids: List[int]):
+        doomed = [(signature_id,) for signature_id in signature_ids]
+        self._conn.executemany("DELETE FROM bands WHERE signature_id = ?", doomed)
+        self._conn.executemany("DELETE FROM signatures WHERE id = ?", doomed)
+        self._total -= len(doomed)
+
+    def count(self, scope: Optional[str] = None) -> int:
+        """Signatures stored under scope, or in the whole index"""
+        with self._lock:
+            if scope is None:
+                return self._total
+            return self._conn.execute("SELECT COUNT(*) FROM signatures WHERE scope = ?", (scope,)).fetchone()[0]
+
+    def clear(self, scope: Optional[str] = None):
+        with self._lock, self._conn:
+            if scope is None:
+                self._conn.execute("DELETE FROM bands")
+                self._conn.execute("DELETE FROM signatures")
+                self._total = 0
+            else:
+                self._conn.execute("DELETE FROM bands WHERE scope = ?", (scope,))
+                self._total -= self._conn.execute("DELETE FROM signatures WHERE scope = ?", (scope,)).rowcount
+
+
+class NearDuplicateFilter:
+    """Accepts questions that are near-duplicates neither of one another nor of the given index scopes.
+
+    One filter lives for one quiz or batch: every accepted question is
+    remembered so later ones are compared against it too. Without an index
+    only the within-batch check is made.
+    """
+
+    def __init__(self, index: Optional[NearDuplicateIndex] = None, scopes: Sequence[str] = (),
+                 num_perm: int = 64, threshold: float = 0.7):
+        self.index = index
+        self.scopes = list(scopes) if index is not None else []
+        self.num_perm = index.num_perm if index is not None else num_perm
+        self.threshold = index.threshold if index is not None else threshold
+        self.accepted: List[np.ndarray] = []
+        self.rejected = 0
+
+    def _signature(self, question: Dict) -> np.ndarray:
+        return minhash_signature(question_text(question), self.num_perm)
+
+    def accept(self, question: Dict) -> bool:
+        signature = self._signature(question)
+        if any(similarity(signature, other) >= self.threshold for other in self.accepted) or (
+                self.scopes and self.index.find(signature, self.scopes) is not None):
+            self.rejected += 1
+            return False
+        self.accepted.append(signature)
+        return True
+
+    def accept_all(self, questions: List[Dict]) -> bool:
+        """Accept every question or, if any is a near-duplicate, none of them"""
+        mark, rejected = len(self.accepted), self.rejected
+        for question in questions:
+            if not self.accept(question):
+                del self.accepted[mark:]
+                self.rejected = rejected
+                return False
+        return True
+
+    def filter(self, questions: Iterable[Dict]) -> List[Dict]:
+        return [question for question in questions if self.accept(question)]
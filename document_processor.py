@@ -1,148 +1,258 @@
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 import os
-from PyPDF2 import PdfReader
-import textwrap
+import threading
+import time
 from dotenv import load_dotenv
+from chunk_cache import ChunkCache
+from corpus import CorpusManager
+from retrieval import BM25Index
+from embeddings import EmbeddingStore, get_default_embedder
+from ingestion import iter_chunks, iter_pages
+from topic_engine import TopicModel
+import tracing
 
 load_dotenv()
 
+
+class CorpusSnapshot:
+    """Everything a reader needs for one version of the corpus, published by a single assignment"""
+
+    __slots__ = ('documents', 'indexes', 'topic_models', 'labels', 'segments')
+
+    def __init__(self, documents: Dict[str, List[str]], indexes: Dict[str, BM25Index],
+                 topic_models: Dict[str, TopicModel], labels: Dict[str, str], segments: Dict[str, tuple]):
+        self.documents = documents
+        self.indexes = indexes
+        self.topic_models = topic_models
+        self.labels = labels
+        # The segments each category index was built from
+        self.segments = segments
+
+
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, corpus_dirs: Optional[List[str]] = None):
         self.chunk_size = 1000
         self.chunk_overlap = 200
-        self.documents = {}
+        # None picks a worker count per PDF based on its page count
+        self.ingest_workers = None
+        self._snapshot = CorpusSnapshot({}, {}, {}, {}, {})
+        self.vector_indexes = {}
+        self.embedder = None
+        self._reload_lock = threading.Lock()
+        self._vector_lock = threading.Lock()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+        project_dir = os.path.dirname(os.path.abspath(__file__))
+        self.cache_dir = os.path.join(project_dir, 'cache')
+        self.chunk_cache = ChunkCache(self.cache_dir)
+        # The bundled PDFs sit loose in the project folder; their categories come from corpus.json
+        self.corpus = CorpusManager(self.load_pdf_chunks, os.path.join(self.cache_dir, 'corpus_state.pkl'))
+        self.corpus.add_source(project_dir, recursive=False)
+        for directory in corpus_dirs or []:
+            if os.path.isdir(directory):
+                self.corpus.add_source(directory)
         # Load PDFs on initialization
         self.load_default_pdfs()
 
-    def get_relevant_chunks(self, query: str, category: str, top_k: int = 3) -> List[str]:
-        """Get document chunks using keyword matching with intelligent scoring"""
-        if category not in self.documents:
-            return []
-
-        chunks = self.documents[category]
-        
-        # Extract meaningful keywords from the query
-        query_lower = query.lower()
-        # Remove common words that might not be relevant for matching
-        stop_words = {'a', 'an', 'the', 'to', 'in', 'on', 'at', 'for', 'of', 'with', 'by', 'similar', 'questions', 'about', 'and', 'or', 'but', 'generate', 'create'}
-        keywords = [word for word in query_lower.split() if word not in stop_words]
-        
-        # If no meaningful keywords found, return evenly spaced chunks
-        if not keywords:
-            if len(chunks) <= top_k:
-                return chunks
-            step = len(chunks) // top_k
-            return [chunks[i] for i in range(0, len(chunks), step)][:top_k]
-        
-        # Score chunks based on keyword matches
-        chunk_scores = []
-        for i, chunk in enumerate(chunks):
-            chunk_lower = chunk.lower()
-            
-            # Calculate base score from keyword matches
-            score = 0
-            matched_keywords = set()
-            
-            for keyword in keywords:
-                # Count occurrences
-                occurrences = chunk_lower.count(keyword)
-                if occurrences > 0:
-                    matched_keywords.add(keyword)
-                    # Points for each occurrence
-                    score += occurrences * 2
-                    
-                    # Bonus for keyword at the start
-                    if chunk_lower.startswith(keyword):
-                        score += 3
-                        
-                    # Bonus for keywords appearing in the first sentence
-                    first_sentence = chunk_lower.split('.')[0]
-                    if keyword in first_sentence:
-                        score += 2
-            
-            # Bonus points for matching multiple different keywords
-            coverage = len(matched_keywords) / len(keywords)
-            score *= (1 + coverage)
-            
-            # Bonus for shorter chunks with matches (more focused content)
-            if score > 0:
-                chunk_scores.append((score, i))
-        
-        # Sort by score and return top_k chunks
-        if chunk_scores:
-            chunk_scores.sort(reverse=True)
-            return [chunks[idx] for _, idx in chunk_scores[:top_k]]
-        
-        # If no matches found, fall back to evenly spaced chunks
-        if len(chunks) <= top_k:
+    # Readers always see one published snapshot; these are views of the current one
+    @property
+    def documents(self) -> Dict[str, List[str]]:
+        return self._snapshot.documents
+
+    @property
+    def indexes(self) -> Dict[str, BM25Index]:
+        return self._snapshot.indexes
+
+    @property
+    def topic_models(self) -> Dict[str, TopicModel]:
+        return self._snapshot.topic_models
+
+    def get_relevant_chunks(self, query: str, category: str, top_k: int = 3,
+                            mode: str = 'keyword') -> List[str]:
+        """Get document chunks ranked by BM25 (mode='keyword') or embedding similarity (mode='semantic')"""
+        with tracing.span('retrieval.search', mode=mode, category=category, top_k=top_k,
+                          query_chars=len(query)) as span:
+            if mode == 'semantic':
+                index = self.get_vector_index(category)
+            else:
+                index = self.indexes.get(category)
+            if index is None:
+                return []
+
+            results = index.search(query, top_k)
+            if results:
+                tracing.inc('retrieval_results_total', len(results), mode=mode, source='index')
+                return [index.chunks[doc_id] for doc_id, _ in results]
+
+            # If no keywords matched, fall back to evenly spaced chunks
+            span.set(fallback=True)
+            chunks = index.chunks
+            if len(chunks) > top_k:
+                step = len(chunks) // top_k
+                chunks = [chunks[i] for i in range(0, len(chunks), step)][:top_k]
+            tracing.inc('retrieval_results_total', len(chunks), mode=mode, source='fallback')
             return chunks
-        step = len(chunks) // top_k
-        return [chunks[i] for i in range(0, len(chunks), step)][:top_k]
 
     def process_pdf(self, pdf_path) -> str:
-        """Process PDF file and return extracted text"""
+        """Process PDF file and return extracted text, one blank line between paragraphs"""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    try:
-                        # Clean and normalize text to handle encoding issues
-                        page_text = page.extract_text()
-                        # Replace problematic characters and normalize whitespace
-                        page_text = page_text.encode('ascii', 'ignore').decode('ascii')
-                        page_text = ' '.join(page_text.split())
-                        text += page_text + "\n"
-                    except Exception as e:
-                        print(f"Error processing page: {e}")
-                        continue
-                return text
+            # Collect pages in a list and join once; appending to a str is quadratic
+            return "\n\n".join(iter_pages(pdf_path, workers=self.ingest_workers))
         except Exception as e:
             print(f"Error reading PDF {pdf_path}: {e}")
             return ""
 
     def get_document_chunks(self, text: str) -> List[str]:
-        """Split document into chunks for processing"""
-        # Remove extra whitespace and split into paragraphs
-        text = " ".join(text.split())
-        paragraphs = text.split('\n\n')
-        
-        # Split long paragraphs into smaller chunks
-        chunks = []
-        for para in paragraphs:
-            if len(para) > self.chunk_size:
-                # Use textwrap to split long paragraphs
-                para_chunks = textwrap.wrap(para, self.chunk_size - self.chunk_overlap)
-                chunks.extend(para_chunks)
-            else:
-                chunks.append(para)
-        
-        return [chunk.strip() for chunk in chunks if chunk.strip()]
+        """Split document into chunks for processing, breaking on paragraph boundaries"""
+        with tracing.span('ingest.chunk', chars=len(text)) as span:
+            chunks = list(iter_chunks([text], self.chunk_size, self.chunk_overlap))
+            span.set(chunks=len(chunks))
+        return chunks
 
-    def process_document(self, pdf_file) -> List[str]:
-        """Process PDF and return chunks of text"""
+    def process_document(self, pdf_file, category: str = 'current') -> List[str]:
+        """Process an uploaded PDF into its own segment of category and return its chunks"""
         text = self.process_pdf(pdf_file)
         chunks = self.get_document_chunks(text)
-        self.documents['current'] = chunks
+        if chunks:
+            with self._reload_lock:
+                self.corpus.add_document(getattr(pdf_file, 'name', str(pdf_file)), category, chunks)
+                self._publish()
         return chunks
 
+    def load_pdf_chunks(self, pdf_path: str) -> List[str]:
+        """Return chunks for a PDF on disk, reusing the chunk cache when the file is unchanged"""
+        with tracing.span('ingest.pdf', path=os.path.basename(pdf_path)) as span:
+            chunks = self.chunk_cache.get(pdf_path, self.chunk_size, self.chunk_overlap)
+            tracing.inc('chunk_cache_lookups_total', result='miss' if chunks is None else 'hit')
+            if chunks is not None:
+                span.set(cached=True, chunks=len(chunks))
+                return chunks
+
+            # Pages are pulled lazily by the chunker; time page production
+            # separately so extraction and chunking can be told apart
+            timings = {}
+            try:
+                pages = iter_pages(pdf_path, workers=self.ingest_workers)
+                if tracing.enabled():
+                    pages = tracing.timed_iter(pages, timings, 'extract_seconds')
+                start = time.perf_counter()
+                chunks = list(iter_chunks(pages, self.chunk_size, self.chunk_overlap))
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                print(f"Error reading PDF {pdf_path}: {e}")
+                return []
+            if 'extract_seconds' in timings:
+                span.set(cached=False, chunks=len(chunks), extract_seconds=timings['extract_seconds'],
+                         chunk_seconds=elapsed - timings['extract_seconds'])
+            tracing.inc('ingest_chunks_total', len(chunks))
+        if chunks:
+            try:
+                self.chunk_cache.put(pdf_path, self.chunk_size, self.chunk_overlap, chunks)
+            except OSError as e:
+                print(f"Error writing chunk cache for {pdf_path}: {e}")
+        return chunks
+
+    def ingest_directory(self, directory: str) -> Dict[str, int]:
+        """Watch directory as another corpus source and load its PDFs.
+
+        Sub-folders become categories (merged with any existing category of
+        the same name); loose PDFs become a category named after the file
+        unless its corpus.json says otherwise. Returns the number of chunks
+        now loaded for each category that changed.
+        """
+        self.corpus.add_source(directory)
+        changes = self.sync()
+        return {category: len(self.documents.get(category, [])) for category in changes['categories']}
+
     def load_default_pdfs(self):
-        """Load the default PDFs included in the project"""
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Define the PDFs and their categories
-        pdfs = {
-            'aptitude': 'INFOSYS -APTITUDE-MODEL paper.pdf',
-            'interview': 'Sample Interview Questions.pdf'
-        }
-        
-        for category, pdf_name in pdfs.items():
-            pdf_path = os.path.join(current_dir, pdf_name)
-            if os.path.exists(pdf_path):
-                text = self.process_pdf(pdf_path)
-                chunks = self.get_document_chunks(text)
-                self.documents[category] = chunks
-                print(f"Loaded {len(chunks)} chunks for {category}")
+        """Load the PDFs of every corpus source"""
+        with tracing.span('ingest.load_default_pdfs'):
+            self.sync()
+
+    def reload(self) -> Dict:
+        """Pick up new, changed and deleted PDFs; see sync"""
+        return self.sync()
+
+    def sync(self) -> Dict:
+        """Ingest new or changed PDFs, tombstone deleted ones and swap in the new corpus.
+
+        Only changed documents are re-chunked and only the categories they
+        belong to are re-indexed; everything is built off to the side and
+        published by one reference assignment, so sessions reading the old
+        corpus keep serving until they next look it up. Concurrent syncs are
+        serialised. Returns CorpusManager.sync's report of the changes.
+        """
+        with self._reload_lock, tracing.span('ingest.sync') as span:
+            changes = self.corpus.sync()
+            span.set(added=len(changes['added']), updated=len(changes['updated']),
+                     removed=len(changes['removed']), dropped=len(changes['dropped']))
+            if changes['categories'] or changes['labels_changed']:
+                self._publish()
+        return changes
+
+    def start_watching(self, interval: float = 30.0, on_change: Optional[Callable[[Dict], None]] = None):
+        """Sync every interval seconds from a daemon thread, calling on_change(changes) after each change"""
+        if self._watch_thread is not None:
+            return
+
+        def loop():
+            while not self._watch_stop.wait(interval):
+                try:
+                    changes = self.sync()
+                    if on_change is not None and (changes['categories'] or changes['removed']):
+                        on_change(changes)
+                except Exception as e:
+                    print(f"Error syncing corpus: {e}")
+
+        self._watch_thread = threading.Thread(target=loop, name='corpus-watcher', daemon=True)
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        self._watch_stop.set()
+
+    def _publish(self):
+        """Index the corpus's segments and make them visible to readers"""
+        previous = self._snapshot
+        documents, indexes, topic_models, built_from = {}, {}, {}, {}
+        for category, segments in self.corpus.segments_by_category().items():
+            segments = tuple(segments)
+            old = previous.segments.get(category)
+            if old is not None and len(old) == len(segments) and all(a is b for a, b in zip(old, segments)):
+                # Reuse the index and topics of a category whose documents are unchanged
+                index = previous.indexes[category]
+                topic_model = previous.topic_models[category]
+            else:
+                index = segments[0].index if len(segments) == 1 else BM25Index.merge([s.index for s in segments])
+                topic_model = TopicModel(index)
+            documents[category] = index.chunks
+            indexes[category] = index
+            topic_models[category] = topic_model
+            built_from[category] = segments
+        labels = {category: self.corpus.label(category) for category in documents}
+        self._snapshot = CorpusSnapshot(documents, indexes, topic_models, labels, built_from)
+
+    def get_topic_model(self, category: str):
+        """Return the canonical topic model built for a category at load time"""
+        return self.topic_models.get(category)
+
+    def get_vector_index(self, category: str):
+        """Return the dense index for a category, embedding its new chunks on first use"""
+        chunks = self.documents.get(category)
+        if chunks is None:
+            return None
+        index = self.vector_indexes.get(category)
+        if index is not None and index.chunks is chunks:
+            return index
+
+        with self._vector_lock:
+            index = self.vector_indexes.get(category)
+            if index is None or index.chunks is not chunks:
+                if self.embedder is None:
+                    self.embedder = get_default_embedder()
+                store = EmbeddingStore(self.cache_dir, category, self.embedder)
+                index = store.load_index(chunks)
+                self.vector_indexes = {**self.vector_indexes, category: index}
+        return index
 
     def get_document_by_category(self, category: str) -> List[str]:
         """Get document chunks by category"""
@@ -150,4 +260,8 @@ class DocumentProcessor:
     
     def get_available_categories(self) -> List[str]:
         """Get list of available document categories"""
-        return list(self.documents.keys())
\ No newline at end of file
+        return list(self.documents.keys())
+
+    def get_category_label(self, category: str) -> str:
+        """Display name of a category, from corpus.json or derived from its name"""
+        return self._snapshot.labels.get(category) or self.corpus.label(category)
@@ -0,0 +1,197 @@
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+import numpy as np
+from chunk_cache import atomic_pickle_dump, chunk_key
+from retrieval import tokenize
+
+STORE_VERSION = 1
+
+
+class HashingEmbedder:
+    """Offline embedder that hashes word and character n-grams into a fixed-size vector.
+
+    Needs no model download or network access, and the same text always
+    maps to the same vector in every process (crc32 rather than ``hash``).
+    """
+
+    def __init__(self, dim: int = 512, char_ngrams: Tuple[int, ...] = (3, 4, 5)):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.name = f"hashing-{dim}-{'-'.join(map(str, char_ngrams))}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        features = list(tokens)
+        features.extend(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        for token in tokens:
+            padded = f"<{token}>"
+            for n in self.char_ngrams:
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in features),
+                                 dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            matrix[row] = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+        return _normalize(matrix)
+
+
+class SentenceTransformerEmbedder:
+    """Wraps a locally installed sentence-transformers model (never downloads)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, local_files_only=True)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(matrix.astype(np.float32))
+
+
+def get_default_embedder():
+    """Use the model named by EMBEDDING_MODEL if it is available locally, else hashing"""
+    model_name = os.getenv('EMBEDDING_MODEL')
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            print(f"Embedding model {model_name} unavailable, using hashing embedder: {e}")
+    return HashingEmbedder()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """Dense top-k search over a (possibly memory-mapped) float32 matrix"""
+
+    def __init__(self, chunks: List[str], matrix: np.ndarray, embedder):
+        self.chunks = chunks
+        self.matrix = matrix
+        self.embedder = embedder
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        if not self.chunks or not query.strip():
+            return []
+        query_vector = self.embedder.embed([query])[0]
+        scores = self.matrix @ query_vector
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+
+class EmbeddingStore:
+    """Per-category embedding matrix persisted as ``<category>_embeddings.npy``.
+
+    ``<category>_embeddings.pkl`` holds the metadata (embedder name and the
+    content hash of the chunk behind each row) and points at the current
+    ``.npy`` file, which is opened with ``mmap_mode='r'`` so every process
+    shares one page-cached copy. Only chunks without a stored vector are
+    embedded when the corpus changes.
+    """
+
+    def __init__(self, cache_dir: str, category: str, embedder):
+        self.cache_dir = cache_dir
+        self.category = category
+        self.embedder = embedder
+        self.meta_path = os.path.join(cache_dir, f"{category}_embeddings.pkl")
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self.meta_path, 'rb') as file:
+                meta = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return None
+        if not isinstance(meta, dict) or meta.get('version') != STORE_VERSION:
+            return None
+        if meta.get('embedder') != self.embedder.name:
+            return None
+        return meta
+
+    def _open_matrix(self, meta: Dict) -> Optional[np.ndarray]:
+        try:
+            matrix = np.load(os.path.join(self.cache_dir, meta['matrix_file']), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if matrix.dtype != np.float32 or matrix.shape != (len(meta['keys']), self.embedder.dim):
+            return None
+        return matrix
+
+    def load_index(self, chunks: List[str]) -> VectorIndex:
+        """Return a VectorIndex for chunks, embedding only those not already stored"""
+        keys = [chunk_key(chunk) for chunk in chunks]
+        meta = self._read_meta()
+        stored = self._open_matrix(meta) if meta else None
+        if stored is not None and meta['keys'] == keys:
+            return VectorIndex(chunks, stored, self.embedder)
+
+        rows = {}
+        if stored is not None:
+            rows = {key: row for row, key in enumerate(meta['keys'])}
+        matrix = np.empty((len(chunks), self.embedder.dim), dtype=np.float32)
+        missing = []
+        for i, key in enumerate(keys):
+            if key in rows:
+                matrix[i] = stored[rows[key]]
+            else:
+                missing.append(i)
+        if missing:
+            matrix[missing] = self.embedder.embed([chunks[i] for i in missing])
+        print(f"Embedded {len(missing)} new chunks for {self.category}")
+
+        try:
+            return VectorIndex(chunks, self._write(keys, matrix), self.embedder)
+        except OSError as e:
+            print(f"Error writing embeddings for {self.category}: {e}")
+            return VectorIndex(chunks, matrix, self.embedder)
+
+    def _write(self, keys: List[str], matrix: np.ndarray) -> np.ndarray:
+        # Each matrix gets a content-addressed file name so a reader can never
+        # pair new metadata with an old matrix (or vice versa).
+        digest = hashlib.sha1(''.join(keys).encode('ascii')).hexdigest()[:16]
+        matrix_file = f"{self.category}_embeddings-{digest}.npy"
+        matrix_path = os.path.join(self.cache_dir, matrix_file)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-', suffix='.npy')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.save(tmp_file, matrix)
+            os.replace(tmp_path, matrix_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        atomic_pickle_dump({
+            'version': STORE_VERSION,
+            'embedder': self.embedder.name,
+            'keys': keys,
+            'matrix_file': matrix_file,
+        }, self.meta_path)
+
+        # Old matrices can go; processes still mapping them keep their pages
+        prefix = f"{self.category}_embeddings-"
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith('.npy') and name != matrix_file:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        return np.load(matrix_path, mmap_mode='r')
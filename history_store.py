@@ -0,0 +1,220 @@
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'history.sqlite3')
+
+
+class HistoryStore:
+    """Persistent quiz attempt history in SQLite (WAL mode).
+
+    Every attempt is stored with its questions, the user's answers and the
+    topics of the questions answered wrongly. Per-user, per-category score
+    totals and per-user topic miss counts are kept up to date in the same
+    transaction, so the sidebar reads a handful of indexed rows no matter
+    how many attempts a user has made. Topic mastery is an exponential
+    moving average of correct answers per topic, starting from 0.5.
+    """
+
+    # Weight of the newest answer in a topic's mastery score
+    MASTERY_RATE = 0.3
+
+    def __init__(self, db_path: str = DEFAULT_HISTORY_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                score REAL NOT NULL,
+                correct INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS attempts_user ON attempts (user_id, id);
+            CREATE INDEX IF NOT EXISTS attempts_user_category ON attempts (user_id, category, id);
+
+            CREATE TABLE IF NOT EXISTS attempt_questions (
+                attempt_id INTEGER NOT NULL REFERENCES attempts (id),
+                position INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                answer INTEGER,
+                is_correct INTEGER NOT NULL,
+                PRIMARY KEY (attempt_id, position)
+            );
+
+            CREATE TABLE IF NOT EXISTS weak_topics (
+                attempt_id INTEGER NOT NULL REFERENCES attempts (id),
+                user_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                topic TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS weak_topics_attempt ON weak_topics (attempt_id);
+
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                score_sum REAL NOT NULL,
+                best_score REAL NOT NULL,
+                last_score REAL NOT NULL,
+                PRIMARY KEY (user_id, category)
+            );
+
+            CREATE TABLE IF NOT EXISTS topic_stats (
+                user_id TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                misses INTEGER NOT NULL,
+                last_missed REAL NOT NULL,
+                PRIMARY KEY (user_id, topic)
+            );
+            CREATE INDEX IF NOT EXISTS topic_stats_misses ON topic_stats (user_id, misses DESC);
+
+            CREATE TABLE IF NOT EXISTS topic_mastery (
+                user_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                mastery REAL NOT NULL,
+                answered INTEGER NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (user_id, category, topic)
+            );
+            CREATE INDEX IF NOT EXISTS topic_mastery_weakest ON topic_mastery (user_id, category, mastery);
+        """)
+        self._conn.commit()
+
+    def record_attempt(self, user_id: str, category: str, questions: List[Dict],
+                       answers: Dict[int, int], weak_topics: List[str]) -> int:
+        """Store one submitted quiz and update the aggregates in a single transaction"""
+        correct_flags = [answers.get(idx) == question['correct_answer'] for idx, question in enumerate(questions)]
+        correct = sum(correct_flags)
+        total = len(questions)
+        score = (correct / total) * 100 if total > 0 else 0
+        now = time.time()
+        topics = sorted(set(topic for topic in weak_topics if topic))
+
+        with self._lock, self._conn:
+            attempt_id = self._conn.execute(
+                "INSERT INTO attempts (user_id, category, score, correct, total, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, category, score, correct, total, now),
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT INTO attempt_questions (attempt_id, position, question, answer, is_correct) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(attempt_id, idx, json.dumps(question, ensure_ascii=False), answers.get(idx), int(flag))
+                 for idx, (question, flag) in enumerate(zip(questions, correct_flags))],
+            )
+            self._conn.executemany(
+                "INSERT INTO weak_topics (attempt_id, user_id, category, topic) VALUES (?, ?, ?, ?)",
+                [(attempt_id, user_id, category, topic) for topic in topics],
+            )
+            self._conn.execute(
+                "INSERT INTO user_stats (user_id, category, attempts, score_sum, best_score, last_score) "
+                "VALUES (?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT (user_id, category) DO UPDATE SET "
+                "attempts = attempts + 1, score_sum = score_sum + excluded.score_sum, "
+                "best_score = MAX(best_score, excluded.best_score), last_score = excluded.last_score",
+                (user_id, category, score, score, score),
+            )
+            self._conn.executemany(
+                "INSERT INTO topic_stats (user_id, topic, misses, last_missed) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (user_id, topic) DO UPDATE SET misses = misses + 1, last_missed = excluded.last_missed",
+                [(user_id, topic, now) for topic in topics],
+            )
+        return attempt_id
+
+    def update_mastery(self, user_id: str, category: str, outcomes: List[Tuple[List[str], bool]]):
+        """Fold (topics, answered_correctly) pairs from one submit into the mastery scores"""
+        now = time.time()
+        rate = self.MASTERY_RATE
+        rows = []
+        for topics, correct in outcomes:
+            outcome = 1.0 if correct else 0.0
+            for topic in topics:
+                rows.append((user_id, category, topic, 0.5 + rate * (outcome - 0.5), now, rate, outcome))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO topic_mastery (user_id, category, topic, mastery, answered, updated) "
+                "VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (user_id, category, topic) DO UPDATE SET "
+                "mastery = mastery + ? * (? - mastery), answered = answered + 1, updated = excluded.updated",
+                rows,
+            )
+
+    def weakest_topics(self, user_id: str, category: str, limit: int = 3) -> List[Dict]:
+        """The user's lowest-mastery topics in a category"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT topic, mastery, answered FROM topic_mastery WHERE user_id = ? AND category = ? "
+                "ORDER BY mastery, updated DESC LIMIT ?", (user_id, category, limit)).fetchall()
+        return [{'topic': topic, 'mastery': mastery, 'answered': answered} for topic, mastery, answered in rows]
+
+    def attempt_count(self, user_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(attempts), 0) FROM user_stats WHERE user_id = ?",
+                                     (user_id,)).fetchone()
+        return row[0]
+
+    def category_summary(self, user_id: str) -> List[Dict]:
+        """Pre-aggregated attempts, average, best and last score per category"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT category, attempts, score_sum, best_score, last_score FROM user_stats "
+                "WHERE user_id = ? ORDER BY category", (user_id,)).fetchall()
+        return [{'category': category, 'attempts': attempts, 'average': score_sum / attempts,
+                 'best': best, 'last': last}
+                for category, attempts, score_sum, best, last in rows]
+
+    def recent_scores(self, user_id: str, limit: int = 50) -> Dict[str, list]:
+        """The user's last ``limit`` attempts, oldest first, as chart columns"""
+        total = self.attempt_count(user_id)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT score, category FROM attempts WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, limit)).fetchall()
+        rows.reverse()
+        first = total - len(rows) + 1
+        return {
+            'Attempt': list(range(first, first + len(rows))),
+            'Score (%)': [score for score, _ in rows],
+            'Category': [category for _, category in rows],
+        }
+
+    def attempts_page(self, user_id: str, page: int = 0, page_size: int = 10) -> List[Dict]:
+        """One page of attempts, newest first"""
+        total = self.attempt_count(user_id)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT score, category, correct, total, created FROM attempts WHERE user_id = ? "
+                "ORDER BY id DESC LIMIT ? OFFSET ?", (user_id, page_size, page * page_size)).fetchall()
+        return [{'Attempt': total - page * page_size - i, 'Score (%)': round(score, 1), 'Category': category,
+                 'Correct': f"{correct}/{count}",
+                 'Date': time.strftime('%Y-%m-%d %H:%M', time.localtime(created))}
+                for i, (score, category, correct, count, created) in enumerate(rows)]
+
+    def latest_weak_topics(self, user_id: str) -> Optional[List[str]]:
+        """Topics missed in the user's most recent attempt, or None if there is none"""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM attempts WHERE user_id = ? ORDER BY id DESC LIMIT 1",
+                                     (user_id,)).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute("SELECT topic FROM weak_topics WHERE attempt_id = ? ORDER BY topic",
+                                      (row[0],)).fetchall()
+        return [topic for topic, in rows]
+
+    def top_weak_topics(self, user_id: str, limit: int = 10) -> List[Dict]:
+        """The user's most frequently missed topics across all attempts"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT topic, misses FROM topic_stats WHERE user_id = ? ORDER BY misses DESC, last_missed DESC "
+                "LIMIT ?", (user_id, limit)).fetchall()
+        return [{'topic': topic, 'misses': misses} for topic, misses in rows]
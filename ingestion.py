@@ -0,0 +1,156 @@
+from typing import Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import re
+import textwrap
+import time
+from PyPDF2 import PdfReader
+import tracing
+
+_PARAGRAPH_BREAK_RE = re.compile(r'\n\s*\n')
+
+# Below this many pages a process pool costs more to start than it saves
+PARALLEL_MIN_PAGES = 32
+
+
+def normalize_page_text(page_text: str) -> str:
+    """Strip non-ASCII characters and collapse whitespace, keeping blank-line paragraph breaks"""
+    page_text = page_text.encode('ascii', 'ignore').decode('ascii')
+    paragraphs = (' '.join(para.split()) for para in _PARAGRAPH_BREAK_RE.split(page_text))
+    return '\n\n'.join(para for para in paragraphs if para)
+
+
+def split_paragraphs(text: str) -> Iterator[str]:
+    """Yield the whitespace-normalised paragraphs of text"""
+    for para in _PARAGRAPH_BREAK_RE.split(text):
+        para = ' '.join(para.split())
+        if para:
+            yield para
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[Tuple[int, str, float]]:
+    """Extract and normalise pages [start, stop) of a PDF (runs in worker processes).
+
+    Each page comes back with its extraction time so the parent can record
+    it; metrics recorded inside a worker process would be lost.
+    """
+    pages = []
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PdfReader(file)
+        for page_number in range(start, stop):
+            try:
+                page_start = time.perf_counter()
+                page_text = pdf_reader.pages[page_number].extract_text() or ""
+                pages.append((page_number, normalize_page_text(page_text), time.perf_counter() - page_start))
+            except Exception as e:
+                print(f"Error processing page {page_number} of {pdf_path}: {e}")
+    return pages
+
+
+def _pool_context():
+    # Forking a multi-threaded process (Streamlit) is unsafe; forkserver/spawn are not
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def count_pages(pdf_path: str) -> int:
+    with open(pdf_path, 'rb') as file:
+        return len(PdfReader(file).pages)
+
+
+def iter_pages(pdf_path: str, workers: Optional[int] = None, batch_size: int = 8) -> Iterator[str]:
+    """Yield the normalised text of each page of a PDF, in order.
+
+    With more than one worker, page ranges are extracted in a process pool.
+    At most ``2 * workers`` batches are in flight at once, so memory stays
+    bounded however long the document is.
+    """
+    num_pages = count_pages(pdf_path)
+    if workers is None:
+        workers = min(4, os.cpu_count() or 1) if num_pages >= PARALLEL_MIN_PAGES else 1
+
+    ranges = [(start, min(start + batch_size, num_pages)) for start in range(0, num_pages, batch_size)]
+    if workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            for _, page_text, seconds in _extract_page_range(pdf_path, start, stop):
+                _record_page(seconds)
+                yield page_text
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+        pending = deque()
+        next_range = 0
+        while pending or next_range < len(ranges):
+            while next_range < len(ranges) and len(pending) < 2 * workers:
+                start, stop = ranges[next_range]
+                pending.append(executor.submit(_extract_page_range, pdf_path, start, stop))
+                next_range += 1
+            for _, page_text, seconds in pending.popleft().result():
+                _record_page(seconds)
+                yield page_text
+
+
+def _record_page(seconds: float):
+    tracing.inc('ingest_pages_total')
+    tracing.observe('ingest_page_seconds', seconds)
+
+
+def _word_tail(text: str, limit: int) -> str:
+    """The longest run of whole words at the end of text that fits in limit characters"""
+    if limit <= 0:
+        return ''
+    if len(text) <= limit:
+        return text
+    tail = text[-limit:]
+    if text[-limit - 1] == ' ':
+        return tail
+    space = tail.find(' ')
+    return tail[space + 1:] if space != -1 else ''
+
+
+def iter_chunks(pages: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[str]:
+    """Pack paragraphs from a stream of page texts into chunks of at most chunk_size characters.
+
+    Chunks break on paragraph boundaries. Paragraphs longer than a chunk are
+    wrapped on word boundaries. Each new chunk starts with the tail of the
+    previous one, up to chunk_overlap characters: whole trailing paragraphs
+    where they fit, then the end of the paragraph before them cut at a word
+    boundary.
+    """
+    current: List[str] = []
+    current_len = 0
+
+    def flush() -> List[str]:
+        # Carry over trailing paragraphs that fit inside the overlap window
+        carried: List[str] = []
+        carried_len = 0
+        for para in reversed(current):
+            if carried_len + len(para) + 1 > chunk_overlap:
+                # Fill the rest of the window with the paragraph's last words
+                tail = _word_tail(para, chunk_overlap - carried_len - 1)
+                if tail:
+                    carried.insert(0, tail)
+                return carried
+            carried.insert(0, para)
+            carried_len += len(para) + 1
+        # A chunk that would be carried whole adds nothing but duplication
+        return []
+
+    for page_text in pages:
+        for para in split_paragraphs(page_text):
+            pieces = [para] if len(para) <= chunk_size else textwrap.wrap(para, chunk_size - chunk_overlap)
+            for piece in pieces:
+                if current and current_len + len(piece) + 1 > chunk_size:
+                    yield ' '.join(current)
+                    current = flush()
+                    current_len = sum(len(p) + 1 for p in current)
+                    if current_len + len(piece) + 1 > chunk_size:
+                        current, current_len = [], 0
+                current.append(piece)
+                current_len += len(piece) + 1
+
+    if current:
+        yield ' '.join(current)
+
@@ -0,0 +1,103 @@
+from typing import Any, List
+import json
+import re
+
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_BETWEEN_ELEMENTS_RE = re.compile(r'[{\]]')
+_IN_ELEMENT_RE = re.compile(r'[{}\[\]"]')
+_IN_STRING_RE = re.compile(r'["\\]')
+
+
+def loads_lenient(text: str) -> Any:
+    """json.loads that also tolerates trailing commas before a closing bracket"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(_TRAILING_COMMA_RE.sub(r'\1', text))
+
+
+class JsonArrayStreamParser:
+    """Incrementally extract the elements of a JSON array of objects from streamed text.
+
+    Text is fed in arbitrary pieces (e.g. model tokens). Anything before the
+    opening ``[`` (such as a code fence) is ignored, and each top-level
+    ``{...}`` element is decoded and returned as soon as its closing brace
+    arrives. Elements that fail to decode are skipped. With
+    ``require_array=False`` objects are picked up without waiting for a ``[``.
+    """
+
+    def __init__(self, require_array: bool = True):
+        self._buffer = []
+        self._in_array = not require_array
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        """True once the closing ``]`` of the array has been seen"""
+        return self._done
+
+    def feed(self, text: str) -> List[Any]:
+        """Consume more text and return the elements completed by it"""
+        # Jump between structural characters with regex searches instead of
+        # stepping through every character in Python
+        completed = []
+        pos = 0
+        end = len(text)
+        while pos < end and not self._done:
+            if not self._in_array:
+                start = text.find('[', pos)
+                if start < 0:
+                    break
+                self._in_array = True
+                pos = start + 1
+            elif self._depth == 0:
+                match = _BETWEEN_ELEMENTS_RE.search(text, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == ']':
+                    self._done = True
+                else:
+                    self._depth = 1
+                    self._buffer = ['{']
+            elif self._in_string:
+                if self._escape:
+                    # The escaped character arrived in this piece
+                    self._buffer.append(text[pos])
+                    self._escape = False
+                    pos += 1
+                    continue
+                match = _IN_STRING_RE.search(text, pos)
+                if match is None:
+                    self._buffer.append(text[pos:])
+                    break
+                self._buffer.append(text[pos:match.end()])
+                pos = match.end()
+                if match.group() == '\\':
+                    self._escape = True
+                else:
+                    self._in_string = False
+            else:
+                match = _IN_ELEMENT_RE.search(text, pos)
+                if match is None:
+                    self._buffer.append(text[pos:])
+                    break
+                self._buffer.append(text[pos:match.end()])
+                pos = match.end()
+                char = match.group()
+                if char == '"':
+                    self._in_string = True
+                elif char in '{[':
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        try:
+                            completed.append(loads_lenient(''.join(self._buffer)))
+                        except ValueError:
+                            pass
+                        self._buffer = []
+        return completed
@@ -0,0 +1,474 @@
+"""Resilient chat-model client used by MCQGenerator.
+
+ResilientChatClient holds one ChatGroq per model of a fallback chain, all
+sharing one keep-alive httpx connection pool (sync and async). Before each
+request a per-model RateLimiter hands out a token; it refills at the
+configured requests per minute and follows the ``x-ratelimit-*`` and
+``retry-after`` headers the server sends back. Rate limits, timeouts,
+connection and 5xx errors are retried with jittered exponential backoff,
+a non-streaming call still running after ``hedge_after`` seconds gets a
+second identical request (the first answer wins), and a model that keeps
+failing hands over to the next one in the chain. When every model has
+failed, LLMUnavailableError is raised instead of returning a placeholder.
+
+Calls made inside ``background_calls()`` (the question bank refill) are
+low priority: they never take the last ``interactive_reserve`` tokens of a
+bucket and never queue ahead of a waiting interactive call.
+"""
+from typing import Callable, Dict, List, Optional, Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+import groq
+import httpx
+from langchain_groq import ChatGroq
+import tracing
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+SMALL_MODEL = "llama-3.1-8b-instant"
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_MODEL_RE = re.compile(rb'"model"\s*:\s*"([^"]+)"')
+_background: contextvars.ContextVar[bool] = contextvars.ContextVar('llm_background', default=False)
+
+
+class LLMUnavailableError(RuntimeError):
+    """Every model in the chain failed; the message has the last error of each"""
+
+
+@contextmanager
+def background_calls():
+    """Mark the model calls made in this block as low priority"""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in a rate-limit reset value such as "7.66s", "2m59.56s" or "120ms" """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    scale = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def retry_after(headers) -> Optional[float]:
+    if headers is None:
+        return None
+    if headers.get('retry-after-ms'):
+        seconds = parse_duration(headers['retry-after-ms'])
+        return seconds / 1000 if seconds is not None else None
+    return parse_duration(headers.get('retry-after'))
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    try:
+        return int(float(headers[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def classify_error(error: BaseException) -> str:
+    """One of rate_limited, timeout, connection, server_error, model_error, fatal or error"""
+    if isinstance(error, groq.RateLimitError):
+        return 'rate_limited'
+    if isinstance(error, (groq.APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, (groq.APIConnectionError, httpx.TransportError)):
+        return 'connection'
+    if isinstance(error, groq.InternalServerError):
+        return 'server_error'
+    if isinstance(error, (groq.AuthenticationError, groq.PermissionDeniedError)):
+        return 'fatal'
+    if isinstance(error, groq.APIStatusError):
+        # 400/404/413/422: this model can't serve the request, another one might
+        return 'model_error'
+    return 'error'
+
+
+class RateLimiter:
+    """Token bucket of requests that also follows the server's rate-limit headers.
+
+    Tokens refill at ``requests_per_minute`` up to ``burst``; 0 for either
+    turns the bucket off, leaving only the server's headers. A 429, an exhausted request allowance or fewer than
+    ``min_remaining_tokens`` model tokens left pauses the bucket until the
+    reset time the server reports. Background calls only take a token
+    while more than ``reserve`` are left.
+    """
+
+    def __init__(self, requests_per_minute: float = 30.0, burst: int = 10, min_remaining_tokens: int = 2000,
+                 reserve: int = 0):
+        # rate 0 disables the bucket (see _reserve)
+        self.rate = requests_per_minute / 60.0 if burst > 0 else 0.0
+        self.capacity = float(max(1, burst))
+        self.min_remaining_tokens = min_remaining_tokens
+        self.reserve = max(0.0, min(float(reserve), self.capacity - 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, max_wait: Optional[float]) -> Optional[float]:
+        """Take a token; returns the seconds to wait first, or None if that exceeds max_wait.
+
+        A background call only takes a token that is free right now; otherwise
+        nothing is taken and it has to ask again after the returned wait.
+        """
+        background = _background.get()
+        with self._lock:
+            now = time.monotonic()
+            wait_time = max(0.0, self.blocked_until - now)
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                needed = 1 + (self.reserve if background else 0)
+                if self.tokens < needed:
+                    wait_time = max(wait_time, (needed - self.tokens) / self.rate)
+            if max_wait is not None and wait_time > max_wait:
+                return None
+            if self.rate > 0 and (wait_time == 0 or not background):
+                self.tokens -= 1
+            return wait_time
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now"""
+        return self._reserve(0.0) is not None
+
+    def acquire(self, max_wait: Optional[float] = None) -> bool:
+        """Wait for a token; False (and nothing taken) if that would take longer than max_wait"""
+        while True:
+            wait_time = self._reserve(max_wait)
+            if wait_time is None:
+                return False
+            if wait_time == 0:
+                return True
+            tracing.observe('llm_client_wait_seconds', wait_time)
+            time.sleep(wait_time)
+            if not _background.get():
+                return True
+            if max_wait is not None:
+                max_wait -= wait_time
+
+    async def acquire_async(self, max_wait: Optional[float] = None) -> bool:
+        while True:
+            wait_time = self._reserve(max_wait)
+            if wait_time is None:
+                return False
+            if wait_time == 0:
+                return True
+            tracing.observe('llm_client_wait_seconds', wait_time)
+            await asyncio.sleep(wait_time)
+            if not _background.get():
+                return True
+            if max_wait is not None:
+                max_wait -= wait_time
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update(self, headers, status_code: int = 200):
+        """Apply the rate-limit headers of one response"""
+        if status_code == 429:
+            self.pause(retry_after(headers) or 1.0)
+        remaining = _header_int(headers, 'x-ratelimit-remaining-requests')
+        if remaining is not None:
+            with self._lock:
+                self.tokens = min(self.tokens, float(remaining))
+            if remaining <= 0:
+                self.pause(parse_duration(headers.get('x-ratelimit-reset-requests')) or 1.0)
+        remaining_tokens = _header_int(headers, 'x-ratelimit-remaining-tokens')
+        if remaining_tokens is not None and remaining_tokens < self.min_remaining_tokens:
+            self.pause(parse_duration(headers.get('x-ratelimit-reset-tokens')) or 1.0)
+
+
+class ResilientChatClient:
+    """ChatGroq-compatible client (invoke / ainvoke / stream) with retries, hedging and model fallback.
+
+    ``models`` is the fallback chain, primary first. Calls that pass
+    ``num_questions`` of at most ``small_quiz_max`` try ``small_quiz_model``
+    first. Streams are retried and fall back only until their first chunk
+    arrives, and are not hedged.
+    """
+
+    def __init__(self, models: Sequence[str], api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 temperature: float = 0.5, max_tokens: int = 4096, timeout: float = 60.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 20.0,
+                 hedge_after: Optional[float] = 20.0, requests_per_minute: float = 30.0, burst: int = 10,
+                 min_remaining_tokens: int = 2000, interactive_reserve: int = 5,
+                 small_quiz_model: Optional[str] = None, small_quiz_max: int = 0, max_connections: int = 20):
+        if not models:
+            raise ValueError("At least one model is required")
+        self.models = list(models)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        # Longest single wait for a retry or a rate-limit token; beyond it the next model is tried
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after or None
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.min_remaining_tokens = min_remaining_tokens
+        # Tokens per bucket that background calls leave for interactive ones
+        self.interactive_reserve = interactive_reserve
+        self.small_quiz_model = small_quiz_model
+        self.small_quiz_max = small_quiz_max
+        self.stats = {'calls': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0, 'fallbacks': 0, 'failures': 0}
+
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                              keepalive_expiry=120.0)
+        http_timeout = httpx.Timeout(timeout, connect=min(10.0, timeout))
+        self.http_client = httpx.Client(limits=limits, timeout=http_timeout,
+                                        event_hooks={'response': [self._on_response]})
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=http_timeout,
+                                                   event_hooks={'response': [self._on_response_async]})
+        self._lock = threading.Lock()
+        self._llms: Dict[str, ChatGroq] = {}
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='llm-call')
+        # Built now so a missing API key fails at startup, not on the first quiz
+        self._llm(self.models[0])
+
+    @classmethod
+    def from_env(cls) -> 'ResilientChatClient':
+        """Client configured from GROQ_* and LLM_* environment variables (see README)"""
+        primary = os.getenv('GROQ_MODEL', DEFAULT_MODEL)
+        fallbacks = [model.strip() for model in os.getenv('GROQ_FALLBACK_MODELS', SMALL_MODEL).split(',')
+                     if model.strip() and model.strip() != primary]
+        return cls(
+            [primary] + fallbacks,
+            api_key=os.getenv('GROQ_API_KEY'),
+            base_url=os.getenv('GROQ_API_BASE') or None,
+            timeout=float(os.getenv('LLM_TIMEOUT', 60)),
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', 3)),
+            backoff_max=float(os.getenv('LLM_BACKOFF_MAX', 20)),
+            hedge_after=float(os.getenv('LLM_HEDGE_AFTER', 20)),
+            requests_per_minute=float(os.getenv('LLM_REQUESTS_PER_MINUTE', 30)),
+            burst=int(os.getenv('LLM_BURST', 10)),
+            min_remaining_tokens=int(os.getenv('LLM_MIN_REMAINING_TOKENS', 2000)),
+            interactive_reserve=int(os.getenv('LLM_INTERACTIVE_RESERVE', 5)),
+            small_quiz_model=os.getenv('GROQ_SMALL_MODEL', SMALL_MODEL),
+            small_quiz_max=int(os.getenv('GROQ_SMALL_QUIZ_MAX', 0)),
+        )
+
+    @property
+    def model_name(self) -> str:
+        return self.models[0]
+
+    def chain_for(self, num_questions: Optional[int] = None) -> List[str]:
+        """Models to try, in order, for a request of num_questions questions"""
+        if (self.small_quiz_model and num_questions is not None
+                and 0 < num_questions <= self.small_quiz_max):
+            return [self.small_quiz_model] + [model for model in self.models if model != self.small_quiz_model]
+        return list(self.models)
+
+    def _llm(self, model: str) -> ChatGroq:
+        with self._lock:
+            llm = self._llms.get(model)
+            if llm is None:
+                extra = {'base_url': self.base_url} if self.base_url else {}
+                # Retries are ours, so the Groq SDK's own are turned off
+                llm = self._llms[model] = ChatGroq(
+                    api_key=self.api_key, model_name=model, temperature=self.temperature,
+                    max_tokens=self.max_tokens, request_timeout=self.timeout, max_retries=0,
+                    http_client=self.http_client, http_async_client=self.http_async_client, **extra)
+            return llm
+
+    def limiter(self, model: str) -> RateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(model)
+            if limiter is None:
+                limiter = self._limiters[model] = RateLimiter(self.requests_per_minute, self.burst,
+                                                              self.min_remaining_tokens, self.interactive_reserve)
+            return limiter
+
+    def _on_response(self, response: httpx.Response):
+        match = _MODEL_RE.search(response.request.content or b'')
+        if match:
+            self.limiter(match.group(1).decode('utf-8', 'replace')).update(response.headers, response.status_code)
+
+    async def _on_response_async(self, response: httpx.Response):
+        self._on_response(response)
+
+    def _count(self, stat: str, model: str, **labels):
+        with self._lock:
+            self.stats[stat] += 1
+        tracing.inc(f'llm_client_{stat}_total', model=model, **labels)
+
+    def backoff(self, attempt: int, wait_hint: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's retry-after"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return max(delay, wait_hint or 0.0)
+
+    def _on_failure(self, model: str, attempt: int, error: BaseException, errors: Dict[str, str]) -> Optional[float]:
+        """Record a failed call; returns the delay before retrying, or None to move to the next model"""
+        kind = classify_error(error)
+        errors[model] = f"{type(error).__name__}: {error}"
+        print(f"LLM call to {model} failed ({kind}, attempt {attempt + 1}): {error}")
+        tracing.inc('llm_client_errors_total', model=model, kind=kind)
+        if kind == 'fatal':
+            raise LLMUnavailableError(f"{model}: {errors[model]}") from error
+        if kind == 'model_error' or attempt >= self.max_retries:
+            return None
+        delay = self.backoff(attempt, retry_after(getattr(getattr(error, 'response', None), 'headers', None)))
+        if delay > self.backoff_max:
+            return None
+        self._count('retries', model, kind=kind)
+        return delay
+
+    def _give_up(self, chain: List[str], errors: Dict[str, str]) -> LLMUnavailableError:
+        with self._lock:
+            self.stats['failures'] += 1
+        details = "; ".join(f"{model}: {errors.get(model, 'rate limited')}" for model in chain)
+        return LLMUnavailableError(f"No model could answer ({details})")
+
+    def _next_model(self, chain: List[str], model: str):
+        position = chain.index(model)
+        if position + 1 < len(chain):
+            print(f"Falling back from {model} to {chain[position + 1]}")
+            self._count('fallbacks', model)
+
+    def _submit(self, call: Callable):
+        # Each call runs in a copy of the caller's context so its spans nest under the caller's
+        return self._hedge_pool.submit(contextvars.copy_context().run, call)
+
+    def _hedged(self, call: Callable, model: str):
+        if self.hedge_after is None:
+            return call()
+        first = self._submit(call)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done or not self.limiter(model).try_acquire():
+            return first.result()
+        self._count('hedges', model)
+        second = self._submit(call)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count('hedge_wins', model)
+                    # The slower request is left to finish (or time out) on its own
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _hedged_async(self, make_call: Callable, model: str):
+        first = asyncio.ensure_future(make_call())
+        tasks = [first]
+        try:
+            if self.hedge_after is None:
+                return await first
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if done or not self.limiter(model).try_acquire():
+                return await first
+            self._count('hedges', model)
+            second = asyncio.ensure_future(make_call())
+            tasks.append(second)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count('hedge_wins', model)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def invoke(self, messages, num_questions: Optional[int] = None, **kwargs):
+        with self._lock:
+            self.stats['calls'] += 1
+        chain = self.chain_for(num_questions)
+        errors: Dict[str, str] = {}
+        for model in chain:
+            llm = self._llm(model)
+            for attempt in range(self.max_retries + 1):
+                if not self.limiter(model).acquire(self.backoff_max):
+                    break
+                try:
+                    return self._hedged(lambda: llm.invoke(messages, **kwargs), model)
+                except Exception as e:
+                    delay = self._on_failure(model, attempt, e, errors)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+            self._next_model(chain, model)
+        raise self._give_up(chain, errors)
+
+    async def ainvoke(self, messages, num_questions: Optional[int] = None, **kwargs):
+        with self._lock:
+            self.stats['calls'] += 1
+        chain = self.chain_for(num_questions)
+        errors: Dict[str, str] = {}
+        for model in chain:
+            llm = self._llm(model)
+            for attempt in range(self.max_retries + 1):
+                if not await self.limiter(model).acquire_async(self.backoff_max):
+                    break
+                try:
+                    return await self._hedged_async(lambda: llm.ainvoke(messages, **kwargs), model)
+                except Exception as e:
+                    delay = self._on_failure(model, attempt, e, errors)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+            self._next_model(chain, model)
+        raise self._give_up(chain, errors)
+
+    def stream(self, messages, num_questions: Optional[int] = None, **kwargs):
+        with self._lock:
+            self.stats['calls'] += 1
+        chain = self.chain_for(num_questions)
+        errors: Dict[str, str] = {}
+        for model in chain:
+            llm = self._llm(model)
+            for attempt in range(self.max_retries + 1):
+                if not self.limiter(model).acquire(self.backoff_max):
+                    break
+                started = False
+                try:
+                    for chunk in llm.stream(messages, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    # Chunks already handed out can't be taken back
+                    if started:
+                        raise
+                    delay = self._on_failure(model, attempt, e, errors)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+            self._next_model(chain, model)
+        raise self._give_up(chain, errors)
+
+    def close(self):
+        self._hedge_pool.shutdown(wait=False)
+        self.http_client.close()
@@ -1,79 +1,31 @@
 
 import streamlit as st
-from document_processor import DocumentProcessor
-from mcq_generator import MCQGenerator
+from contextlib import nullcontext
+from shared import get_dedup_index, get_document_processor, get_history_store, get_mcq_generator, get_question_bank
 import os
+import uuid
 from dotenv import load_dotenv
+from quiz_assembly import assemble_quiz
+from rerun_timing import timed_panel
+import tracing
+from topic_engine import build_topic_query, score_quiz
 
 load_dotenv()
 
-def main():
-    st.title("Placement AI - Your Personal Interview and Aptitude Trainer")
-    
-    # Initialize processors
-    doc_processor = DocumentProcessor()
-    mcq_generator = MCQGenerator()
-    
-    # Session state for storing questions, answers, and history
-    if 'questions' not in st.session_state:
-        st.session_state.questions = []
-    if 'answers' not in st.session_state:
-        st.session_state.answers = {}
-    if 'submitted' not in st.session_state:
-        st.session_state.submitted = False
-    if 'score_history' not in st.session_state:
-        st.session_state.score_history = []
-    if 'category_history' not in st.session_state:
-        st.session_state.category_history = []
-    if 'current_weak_areas' not in st.session_state:
-        st.session_state.current_weak_areas = []
-    
-    # Sidebar for configuration and score
-    with st.sidebar:
-        st.header("Configuration")
-        
-        # Document category selection
-        category = st.selectbox(
-            "Select Question Category",
-            doc_processor.get_available_categories(),
-            format_func=lambda x: "Aptitude Questions" if x == "aptitude" else "Interview Questions"
-        )
-        
-        # Current test score
-        if st.session_state.submitted:
-            # Calculate current score
-            correct_answers = sum(1 for q_idx, ans in st.session_state.answers.items() 
-                                if ans == st.session_state.questions[q_idx]['correct_answer'])
-            total_questions = len(st.session_state.questions)
-            percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
-            
-            # Display current score
-            st.metric("Current Score", f"{correct_answers}/{total_questions}")
-            st.progress(percentage / 100)
-            st.write(f"Current Percentage: {percentage:.1f}%")
-
-            # Add current score to history
-            if len(st.session_state.score_history) == 0 or st.session_state.score_history[-1] != percentage:
-                st.session_state.score_history.append(percentage)
-                st.session_state.category_history.append(category)
-                
-                # Analyze weak areas
-                weak_areas = []
-                for idx, question in enumerate(st.session_state.questions):
-                    if st.session_state.answers.get(idx) != question['correct_answer']:
-                        concept = question['explanation'].split('.')[0]
-                        weak_areas.append(concept)
-                st.session_state.current_weak_areas = weak_areas
 
+@st.fragment
+def history_panel(history_store, user_id, category):
+    """Past scores and improvements; its buttons and pager rerun only this panel"""
+    with timed_panel('history'):
         # Separate buttons for past scores and improvements
         st.write("---")
         col1, col2 = st.columns(2)
-        
+
         with col1:
             if st.button("📊 View Past Scores"):
                 st.session_state.show_history = True
                 st.session_state.show_improvements = False
-                
+
         with col2:
             if st.button("📈 View Improvements"):
                 st.session_state.show_improvements = True
@@ -85,128 +37,278 @@ def main():
         if 'show_improvements' not in st.session_state:
             st.session_state.show_improvements = False
 
+        attempt_count = history_store.attempt_count(user_id)
+
         # Display Past Scores
-        if st.session_state.show_history and len(st.session_state.score_history) > 0:
+        if st.session_state.show_history and attempt_count > 0:
             st.subheader("📊 Score History")
-            
-            # Create score history chart
-            history_data = {
-                'Attempt': list(range(1, len(st.session_state.score_history) + 1)),
-                'Score (%)': st.session_state.score_history,
-                'Category': st.session_state.category_history
-            }
+
+            # Chart the most recent attempts
+            history_data = history_store.recent_scores(user_id, limit=50)
             st.line_chart(history_data, x='Attempt', y='Score (%)')
-            
-            # Show detailed history
+
+            # Per-category averages come pre-aggregated from the store
+            st.dataframe(history_store.category_summary(user_id), hide_index=True)
+
+            # Show detailed history one page at a time
             st.write("Detailed History:")
-            for i, (score, cat) in enumerate(zip(st.session_state.score_history, st.session_state.category_history)):
-                st.write(f"Attempt {i+1}: {score:.1f}% - {cat}")
+            page_size = 10
+            num_pages = (attempt_count + page_size - 1) // page_size
+            page = st.number_input("Page", min_value=1, max_value=num_pages, value=1) if num_pages > 1 else 1
+            st.dataframe(history_store.attempts_page(user_id, page - 1, page_size), hide_index=True)
 
         # Display Improvements Analysis
-        if st.session_state.show_improvements and len(st.session_state.score_history) > 0:
+        if st.session_state.show_improvements and attempt_count > 0:
             st.subheader("📌 Topics to Review")
-            
-            # Extract topics from current test
-            if st.session_state.submitted and st.session_state.questions:
-                topics_to_review = set()  # Using set to avoid duplicates
-                for idx, question in enumerate(st.session_state.questions):
-                    if st.session_state.answers.get(idx) != question['correct_answer']:
-                        # Extract topic from the first sentence of explanation
-                        topic = question['explanation'].split('.')[0].strip()
-                        topics_to_review.add(topic)
-                
-                if topics_to_review:
-                    st.warning("These topics need more practice:")
-                    for topic in topics_to_review:
-                        st.write(f"📌 {topic}")
-                    
-                    # Simple recommendation
-                    st.write("")  # Add some spacing
-                    st.info("💡 Focus on reviewing these topics before moving forward.")
-                else:
-                    st.success("🎉 Great job! You have a good understanding of all topics in this test.")
+
+            # Topics missed in the latest attempt
+            topics_to_review = history_store.latest_weak_topics(user_id)
+            if topics_to_review:
+                st.warning("These topics need more practice:")
+                st.markdown("\n".join(f"- 📌 {topic}" for topic in topics_to_review))
+
+                # Simple recommendation
+                st.write("")  # Add some spacing
+                st.info("💡 Focus on reviewing these topics before moving forward.")
+            else:
+                st.success("🎉 Great job! You have a good understanding of all topics in this test.")
+
+            # Lowest mastery in the selected category
+            weakest = history_store.weakest_topics(user_id, category, limit=5)
+            if weakest:
+                st.write("Lowest mastery in this category:")
+                st.markdown("\n".join(f"- {item['topic']} ({item['mastery'] * 100:.0f}%)" for item in weakest))
+
+            # Topics missed most often across all attempts
+            frequent = history_store.top_weak_topics(user_id, limit=5)
+            if frequent:
+                st.write("Most missed overall:")
+                st.markdown("\n".join(f"- {item['topic']} ({item['misses']}×)" for item in frequent))
+
+
+@st.fragment
+def quiz_panel(doc_processor, history_store, user_id, category):
+    """The question form; scoring and recording happen here, once, on submit"""
+    with timed_panel('quiz'):
+        # Create a form for all questions
+        with st.form("quiz_form"):
+            for idx, question in enumerate(st.session_state.questions):
+                st.subheader(f"Question {idx + 1}")
+                st.write(question["question"])
+
+                # Display options as radio buttons
+                answer = st.radio(
+                    "Select your answer:",
+                    options=question["options"],
+                    key=f"q_{idx}",
+                    index=None  # No default selection
+                )
+
+                # Store answer in session state
+                if answer is not None:
+                    st.session_state.answers[idx] = question["options"].index(answer)
+
+                st.write("---")  # Divider between questions
+
+            # Submit button for all questions
+            submit_button = st.form_submit_button("Submit All Answers")
+
+    if (submit_button and st.session_state.quiz_result is None
+            and len(st.session_state.answers) == len(st.session_state.questions)):
+        result = score_quiz(st.session_state.questions, st.session_state.answers,
+                            doc_processor.get_topic_model(category))
+        history_store.record_attempt(user_id, category, st.session_state.questions,
+                                     st.session_state.answers, result['weak_areas'])
+        history_store.update_mastery(user_id, category, result['outcomes'])
+        st.session_state.quiz_result = result
+        st.session_state.submitted = True
+        # The score and history panels live outside this fragment
+        st.rerun()
+
+
+@st.fragment
+def results_panel():
+    """Per-question results, rendered from the memoized score"""
+    with timed_panel('results'):
+        st.header("Results")
+        correct_flags = st.session_state.quiz_result['correct_flags']
+        for idx, question in enumerate(st.session_state.questions):
+            user_answer_idx = st.session_state.answers.get(idx)
+            correct_answer_idx = question["correct_answer"]
+
+            with st.expander(f"Question {idx + 1} - {'Correct ✅' if correct_flags[idx] else 'Incorrect ❌'}"):
+                st.write(question["question"])
+                st.write("Your answer:", question["options"][user_answer_idx])
+                if not correct_flags[idx]:
+                    st.write("Correct answer:", question["options"][correct_answer_idx])
+                st.write("Explanation:", question["explanation"])
+
+        if st.button("Try Again"):
+            st.session_state.questions = []
+            st.session_state.answers = {}
+            st.session_state.submitted = False
+            st.session_state.quiz_result = None
+            st.rerun()
+
+
+def main():
+    with timed_panel('app'):
+        render_app()
+
+
+def render_app():
+    st.title("Placement AI - Your Personal Interview and Aptitude Trainer")
+    
+    # Shared across sessions; per-session state lives in st.session_state
+    doc_processor = get_document_processor()
+    mcq_generator = get_mcq_generator()
+    question_bank = get_question_bank()
+    dedup_index = get_dedup_index()
+    history_store = get_history_store()
+
+    # Main-area slot for questions that arrive while a quiz is streaming
+    stream_area = st.empty()
+    
+    # Session state for storing questions, answers, and history
+    if 'questions' not in st.session_state:
+        st.session_state.questions = []
+    if 'answers' not in st.session_state:
+        st.session_state.answers = {}
+    if 'submitted' not in st.session_state:
+        st.session_state.submitted = False
+    if 'quiz_result' not in st.session_state:
+        st.session_state.quiz_result = None
+    if 'generation_metrics' not in st.session_state:
+        st.session_state.generation_metrics = {}
+    if 'served_question_ids' not in st.session_state:
+        st.session_state.served_question_ids = set()
+    if 'session_user_id' not in st.session_state:
+        # Anonymous visitors get their own id so they never share history or mastery
+        st.session_state.session_user_id = f"guest-{uuid.uuid4().hex[:12]}"
+    
+    # Sidebar for configuration and score
+    with st.sidebar:
+        st.header("Configuration")
+
+        # History is stored per user id so it survives refreshes
+        default_user = st.query_params.get("user") or st.session_state.session_user_id
+        user_id = st.text_input("User ID", value=default_user).strip() or st.session_state.session_user_id
+        # Keep the id in the URL so a reload comes back to the same history
+        if st.query_params.get("user") != user_id:
+            st.query_params["user"] = user_id
+        
+        # Document category selection
+        category = st.selectbox(
+            "Select Question Category",
+            doc_processor.get_available_categories(),
+            # Labels come from corpus.json, or are derived from the folder or file name
+            format_func=doc_processor.get_category_label
+        )
+
+        # Retrieval strategy for picking reference chunks
+        retrieval_mode = st.selectbox(
+            "Retrieval Mode",
+            ["keyword", "semantic"],
+            format_func=lambda x: "Keyword (BM25)" if x == "keyword" else "Semantic (embeddings)"
+        )
+        
+        # Current test score, computed once when the quiz was submitted
+        result = st.session_state.quiz_result
+        if st.session_state.submitted and result is not None:
+            st.metric("Current Score", f"{result['correct']}/{result['total']}")
+            st.progress(result['percentage'] / 100)
+            st.write(f"Current Percentage: {result['percentage']:.1f}%")
+
+        history_panel(history_store, user_id, category)
         
         num_questions = st.select_slider(
             "Number of Questions",
             options=[10, 15, 20, 25, 30],
             value=10
         )
+
+        stream_questions = st.checkbox("Show questions as they are generated", value=True)
+
+        if mcq_generator.response_cache is not None:
+            cache_stats = mcq_generator.response_cache.stats()
+            st.caption(f"Question cache: {cache_stats['hits'] + cache_stats['pool_hits']} hits / "
+                       f"{cache_stats['misses']} misses · ~{cache_stats['saved_seconds']:.0f}s of generation saved")
         
+        # One-off cProfile + tracemalloc capture of the next generation
+        profile_next = tracing.enabled() and st.checkbox("Profile next generation")
+
         if st.button("Generate Questions"):
-            with st.spinner("Generating questions..."):
-                # Get relevant document chunks based on previous questions or default context
+            capture = tracing.profile_capture('generate', memory=True) if profile_next else nullcontext()
+            with st.spinner("Generating questions..."), capture as profile_paths, \
+                    tracing.span('request.generate', category=category, num_questions=num_questions):
+                # Target the user's weakest topics, falling back to general coverage
                 query = "Generate questions about core concepts and important topics"
-                if st.session_state.questions:
-                    # Use previous questions to guide next question generation
-                    recent_questions = [q["question"] for q in st.session_state.questions[-3:]]
-                    query = "Generate questions similar to: " + " ".join(recent_questions)
+                weakest = history_store.weakest_topics(user_id, category, limit=3)
+                if weakest:
+                    query = build_topic_query([item['topic'] for item in weakest])
                 
                 # Get relevant chunks directly (no async needed)
-                relevant_chunks = doc_processor.get_relevant_chunks(query, category, top_k=3)
+                relevant_chunks = doc_processor.get_relevant_chunks(query, category, top_k=3, mode=retrieval_mode)
                 
                 if relevant_chunks:
-                    # Join chunks with proper spacing and add context
-                    document_text = " ".join(relevant_chunks)
-                    questions = mcq_generator.generate_mcqs(document_text, num_questions)
-                    
-                    # Reset session state
-                    st.session_state.questions = questions
-                    st.session_state.answers = {}
-                    st.session_state.submitted = False
-                    
-                    if len(questions) > 0 and not isinstance(questions[0], dict):
-                        st.error("Error generating questions. Please try again.")
+                    # Serve from the pre-generated bank first and generate only the
+                    # shortfall, skipping anything close to what this user was served
+                    live = stream_area.container() if stream_questions else None
+
+                    def show_question(question, number):
+                        # Render each question as soon as the model finishes it
+                        if number == 1:
+                            live.header("Multiple Choice Questions")
+                        live.subheader(f"Question {number}")
+                        live.write(question.get("question", ""))
+                        for option in question.get("options", []):
+                            live.write(f"- {option}")
+                        live.write("---")
+
+                    questions, metrics, generation_error = assemble_quiz(
+                        question_bank, mcq_generator, dedup_index, category, relevant_chunks, query,
+                        num_questions, st.session_state.served_question_ids, f"user:{user_id}",
+                        stream=stream_questions, on_question=show_question if stream_questions else None)
+                    stream_area.empty()
+
+                    if not questions:
+                        # Keep whatever quiz was on screen; nothing replaces it
+                        st.error(f"Could not generate questions, please try again. ({generation_error})")
+                    else:
+                        if len(questions) < num_questions:
+                            # Near-duplicates of earlier quizzes may be dropped without any error
+                            st.warning(f"Only {len(questions)} of {num_questions} questions could be prepared."
+                                       + (f" ({generation_error})" if generation_error else ""))
+                        st.session_state.generation_metrics = metrics
+
+                        # Reset session state
+                        st.session_state.questions = questions
+                        st.session_state.answers = {}
+                        st.session_state.submitted = False
+                        st.session_state.quiz_result = None
                 else:
                     st.error(f"No content found for category: {category}")
+            if profile_paths:
+                st.caption("Profile written to " + ", ".join(profile_paths.values()))
     
     # Main content area
     if st.session_state.questions:
         st.header("Multiple Choice Questions")
+
+        metrics = st.session_state.generation_metrics
+        if metrics.get('time_to_full_quiz') is not None:
+            timing = f"Full quiz in {metrics['time_to_full_quiz']:.1f}s"
+            if metrics.get('time_to_first_question') is not None:
+                timing = f"First question in {metrics['time_to_first_question']:.1f}s · " + timing
+            if metrics.get('from_bank'):
+                timing += f" · {metrics['from_bank']} from the question bank"
+            st.caption(timing)
         
-        # Create a form for all questions
-        with st.form("quiz_form"):
-            for idx, question in enumerate(st.session_state.questions):
-                st.subheader(f"Question {idx + 1}")
-                st.write(question["question"])
-                
-                # Display options as radio buttons
-                answer = st.radio(
-                    "Select your answer:",
-                    options=question["options"],
-                    key=f"q_{idx}",
-                    index=None  # No default selection
-                )
-                
-                # Store answer in session state
-                if answer is not None:
-                    st.session_state.answers[idx] = question["options"].index(answer)
-                
-                st.write("---")  # Divider between questions
-            
-            # Submit button for all questions
-            submit_button = st.form_submit_button("Submit All Answers")
-            if submit_button and len(st.session_state.answers) == len(st.session_state.questions):
-                st.session_state.submitted = True
+        quiz_panel(doc_processor, history_store, user_id, category)
         
         # Display results after submission
-        if st.session_state.submitted:
-            st.header("Results")
-            for idx, question in enumerate(st.session_state.questions):
-                user_answer_idx = st.session_state.answers.get(idx)
-                correct_answer_idx = question["correct_answer"]
-                
-                with st.expander(f"Question {idx + 1} - {'Correct ✅' if user_answer_idx == correct_answer_idx else 'Incorrect ❌'}"):
-                    st.write(question["question"])
-                    st.write("Your answer:", question["options"][user_answer_idx])
-                    if user_answer_idx != correct_answer_idx:
-                        st.write("Correct answer:", question["options"][correct_answer_idx])
-                    st.write("Explanation:", question["explanation"])
-            
-            if st.button("Try Again"):
-                st.session_state.questions = []
-                st.session_state.answers = {}
-                st.session_state.submitted = False
-                st.rerun()
+        if st.session_state.submitted and st.session_state.quiz_result is not None:
+            results_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,24 +1,67 @@
-from typing import List, Dict
-from langchain_groq import ChatGroq
+from typing import List, Dict, Iterator, Optional
+import asyncio
+import re
+import threading
+import time
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 import os
 from dotenv import load_dotenv
+from context_builder import build_context, count_tokens
+from dedup_index import NearDuplicateFilter
+from json_stream import JsonArrayStreamParser
+from llm_client import LLMUnavailableError, ResilientChatClient
+from mcq_parser import parse_mcq_response, validate_question
+from response_cache import ResponseCache, make_key
+import tracing
 
 load_dotenv()
 
+
+class GenerationError(RuntimeError):
+    """No question could be generated; the message says why"""
+
+
 class MCQGenerator:
-    def __init__(self):
-        self.groq = ChatGroq(
-            api_key=os.getenv('GROQ_API_KEY'),
-            model_name="llama-3.3-70b-versatile",
-            temperature=0.5,  # Lower temperature for more consistent output
-            max_tokens=4096,  # Increased for better context handling
+    def __init__(self, llm=None):
+        # Any ChatGroq-compatible chat model can be passed in (benchmarks use a
+        # local stand-in). The default client retries, hedges and falls back
+        # across models (llm_client.py); GROQ_API_BASE points it elsewhere
+        self.groq = llm if llm is not None else ResilientChatClient.from_env()
+        # Batching and retry settings for generation
+        self.batch_size = 5
+        self.max_concurrency = 4
+        self.max_batch_retries = 2
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        # Cache of generated questions keyed by prompt + model parameters;
+        # set to None to always call the model
+        self.response_cache = ResponseCache(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'responses.sqlite3'),
+            ttl_seconds=float(os.getenv('MCQ_CACHE_TTL', 7 * 24 * 3600)),
         )
-        self.output_parser = JsonOutputParser()
-        self.previous_questions = []  # Store previous questions for context
+        # Serve a random subset of previously generated questions for the same context
+        self.serve_from_pool = os.getenv('MCQ_SERVE_FROM_POOL') == '1'
+        # Prompt and output token budgets; the output budget of each call
+        # scales with the number of questions it asks for
+        self.context_token_budget = int(os.getenv('MCQ_CONTEXT_TOKENS', 600))
+        self.output_tokens_per_question = 160
+        self.max_output_tokens = int(os.getenv('MCQ_MAX_OUTPUT_TOKENS', 8192))
+
+    def build_context(self, chunks: List[str], query: str = "") -> str:
+        """Reference text for a prompt: retrieved chunks de-duplicated and trimmed to the context budget"""
+        return build_context(chunks, query, self.context_token_budget)
+
+    def _output_budget(self, num_questions: int) -> int:
+        return min(self.max_output_tokens, 64 + num_questions * self.output_tokens_per_question)
 
-    def generate_mcqs(self, context: str, num_questions: int = 10) -> List[Dict]:
+    def _llm_kwargs(self, num_questions: int) -> Dict:
+        kwargs = {'max_tokens': self._output_budget(num_questions)}
+        # The resilient client picks its model chain by quiz size
+        if isinstance(self.groq, ResilientChatClient):
+            kwargs['num_questions'] = num_questions
+        return kwargs
+
+    def _build_messages(self, context: str, num_questions: int, batch_note: str = "") -> List[Dict]:
         template = """You are an expert at creating practice questions similar to existing question patterns.
 Given the following reference material, generate {num_questions} multiple choice questions that match the style and difficulty
 of typical questions in this domain. The questions should test similar concepts but be newly formulated.
@@ -62,58 +105,350 @@ Requirements:
 
 Remember: Create questions that feel like they could have been part of the original material."""
 
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": "You are a professional MCQ generator. You will generate questions in a specific JSON format."
             },
             {
                 "role": "user",
-                "content": template.format(num_questions=num_questions, context=context)
+                "content": template.format(num_questions=num_questions, context=context) + batch_note
             }
         ]
 
+    def _parse_questions(self, response_text: str) -> List[Dict]:
+        """Return every valid question in a model response, dropping malformed ones"""
+        questions, errors = parse_mcq_response(response_text)
+        if errors:
+            print(f"Discarded {len(errors)} malformed questions: {'; '.join(errors[:3])}")
+        return questions
+
+    @staticmethod
+    def _trace_llm_call(span, kind: str, messages: List[Dict], content: str, usage: Optional[Dict],
+                        num_questions: int):
+        """Attach prompt size, token counts and parsed questions to an LLM span"""
+        if not tracing.enabled():
+            return
+        prompt_chars = sum(len(message['content']) for message in messages)
+        usage = usage or {}
+        # Counted locally when the client doesn't report usage
+        tokens_in = usage.get('input_tokens') or sum(count_tokens(message['content']) for message in messages)
+        tokens_out = usage.get('output_tokens') or count_tokens(content)
+        span.set(prompt_chars=prompt_chars, tokens_in=tokens_in, tokens_out=tokens_out, questions=num_questions)
+        tracing.inc('llm_calls_total', kind=kind, outcome='ok')
+        tracing.inc('llm_prompt_chars_total', prompt_chars, kind=kind)
+        tracing.inc('llm_tokens_total', tokens_in, kind=kind, direction='in')
+        tracing.inc('llm_tokens_total', tokens_out, kind=kind, direction='out')
+        tracing.inc('llm_questions_total', num_questions, kind=kind)
+
+    @staticmethod
+    def _trace_llm_error(span, kind: str, error: str):
+        span.set(error=error)
+        tracing.inc('llm_calls_total', kind=kind, outcome='error')
+
+    def _merge_unique(self, questions: List[Dict], seen: set, batch: List[Dict],
+                      near_dupes: NearDuplicateFilter):
+        """Append the questions of batch that are neither repeats nor near-duplicates"""
+        for question in batch:
+            key = self._question_key(question)
+            if key and key not in seen and near_dupes.accept(question):
+                seen.add(key)
+                questions.append(question)
+
+    def _cache_keys(self, context: str, num_questions: int):
+        model = (self.groq.model_name, self.groq.temperature, self.groq.max_tokens)
+        key = make_key(self._build_messages(context, num_questions), *model)
+        pool_key = make_key(context, *model)
+        return key, pool_key
+
+    def _cache_lookup(self, context: str, num_questions: int,
+                      near_dupes: Optional[NearDuplicateFilter] = None) -> Optional[List[Dict]]:
+        if self.response_cache is None:
+            return None
+        key, pool_key = self._cache_keys(context, num_questions)
+        # A cached quiz the user has (nearly) seen already counts as a miss
+        accept = near_dupes.accept_all if near_dupes is not None else None
         try:
-            response = self.groq.invoke(messages)
-            response_text = str(response.content)
-            
-            # Clean up the response
-            response_text = response_text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text.split('```json')[1]
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-            if response_text.endswith('```'):
-                response_text = response_text.rsplit('```', 1)[0]
-            response_text = response_text.strip()
-            
-            # Ensure the response starts with [ and ends with ]
-            if not (response_text.startswith('[') and response_text.endswith(']')):
-                raise ValueError("Response is not a valid JSON array")
-            
-            # Parse the JSON
-            questions = self.output_parser.parse(response_text)
-            
-            # Validate the response
-            if not isinstance(questions, list):
-                raise ValueError("Response is not a list")
-            
-            # Ensure we have exactly the number of questions requested
-            if len(questions) > num_questions:
-                questions = questions[:num_questions]  # Take only the requested number
-            elif len(questions) < num_questions:
-                raise ValueError(f"Not enough questions generated. Expected {num_questions}, got {len(questions)}")
-            
+            if self.serve_from_pool:
+                questions = self.response_cache.sample_pool(pool_key, num_questions, accept)
+                if questions is not None:
+                    tracing.inc('response_cache_lookups_total', result='pool_hit')
+                    return questions
+            questions = self.response_cache.get(key, accept)
+            tracing.inc('response_cache_lookups_total', result='miss' if questions is None else 'hit')
             return questions
-            
         except Exception as e:
-            print(f"Error generating questions: {str(e)}")
-            # Return a default structure to help with debugging
-            return [
-                {
-                    "question": "Error generating questions. Please try again.",
-                    "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
-                    "correct_answer": 0,
-                    "explanation": str(e)
-                }
-            ]
\ No newline at end of file
+            print(f"Error reading response cache: {str(e)}")
+            return None
+
+    def _cache_store(self, context: str, num_questions: int, questions: List[Dict], latency: float):
+        # Only complete quizzes are worth replaying
+        if self.response_cache is None or len(questions) != num_questions:
+            return
+        key, pool_key = self._cache_keys(context, num_questions)
+        try:
+            self.response_cache.put(key, pool_key, questions, latency)
+        except Exception as e:
+            print(f"Error writing response cache: {str(e)}")
+
+    def generate_mcqs(self, context: str, num_questions: int = 10, use_cache: bool = True,
+                      near_dupes: Optional[NearDuplicateFilter] = None) -> List[Dict]:
+        """Generate num_questions questions, skipping near-duplicates of each other and of near_dupes.
+
+        Raises GenerationError if not a single question could be generated.
+        """
+        with tracing.span('generate.mcqs', requested=num_questions) as span:
+            questions = self._generate_mcqs(context, num_questions, use_cache, near_dupes or NearDuplicateFilter())
+            span.set(returned=len(questions))
+            return questions
+
+    def _generate_mcqs(self, context: str, num_questions: int, use_cache: bool,
+                       near_dupes: NearDuplicateFilter) -> List[Dict]:
+        # Callers that want fresh questions for the same context (e.g. the
+        # question bank refill) skip the lookup; results are still stored
+        cached = self._cache_lookup(context, num_questions, near_dupes) if use_cache else None
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        questions, last_error = self._collect_questions(context, num_questions, near_dupes)
+        if not questions:
+            raise GenerationError(last_error)
+        if len(questions) < num_questions:
+            print(f"Generated {len(questions)} of {num_questions} questions after retries")
+        # Take only the requested number
+        questions = questions[:num_questions]
+        self._cache_store(context, num_questions, questions, time.perf_counter() - start)
+        return questions
+
+    def _collect_questions(self, context: str, num_questions: int, near_dupes: NearDuplicateFilter,
+                           first_attempt: int = 0):
+        """Call the model until num_questions new questions are collected or retries run out.
+
+        ``first_attempt`` counts calls already made for this quiz (e.g. the
+        stream) against ``max_batch_retries``. Returns the questions and the
+        last error message.
+        """
+        questions: List[Dict] = []
+        seen = set()
+        last_error = "No valid questions in the model response"
+
+        # Valid questions are kept; rejected or missing ones are asked for again
+        for attempt in range(first_attempt, self.max_batch_retries + 1):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            batch_note = "" if attempt == 0 else "\n\nCover different concepts and scenarios from earlier sets."
+            if attempt > 0:
+                tracing.inc('llm_retries_total', kind='invoke')
+            messages = self._build_messages(context, missing, batch_note)
+            with tracing.span('llm.call', kind='invoke', attempt=attempt, requested=missing) as span:
+                try:
+                    response = self.groq.invoke(messages, **self._llm_kwargs(missing))
+                    content = str(response.content)
+                    batch = self._parse_questions(content)
+                    self._trace_llm_call(span, 'invoke', messages, content,
+                                         getattr(response, 'usage_metadata', None), len(batch))
+                    self._merge_unique(questions, seen, batch, near_dupes)
+                except Exception as e:
+                    last_error = str(e)
+                    print(f"Error generating questions: {last_error}")
+                    self._trace_llm_error(span, 'invoke', last_error)
+                    # The client has already retried every model
+                    if isinstance(e, LLMUnavailableError):
+                        break
+        return questions[:num_questions], last_error
+
+    def stream_mcqs(self, context: str, num_questions: int = 10, metrics: Optional[Dict] = None,
+                    near_dupes: Optional[NearDuplicateFilter] = None) -> Iterator[Dict]:
+        """Yield questions one by one as the model streams them.
+
+        Each question is yielded as soon as its closing brace arrives.
+        Malformed and near-duplicate questions are skipped; whatever the
+        stream did not deliver is asked for again once it ends, within
+        ``max_batch_retries``. If ``metrics`` is given it is filled with
+        ``time_to_first_question``, ``time_to_full_quiz`` (seconds) and
+        ``questions``. Raises GenerationError if no question could be
+        generated.
+        """
+        if metrics is not None:
+            metrics.update(time_to_first_question=None, time_to_full_quiz=None, questions=0)
+        near_dupes = near_dupes or NearDuplicateFilter()
+        cached = self._cache_lookup(context, num_questions, near_dupes)
+        if cached is not None:
+            if metrics is not None:
+                metrics.update(time_to_first_question=0.0, time_to_full_quiz=0.0, questions=len(cached))
+            yield from cached
+            return
+
+        messages = self._build_messages(context, num_questions)
+        parser = JsonArrayStreamParser()
+        start = time.perf_counter()
+        count = 0
+        streamed = []
+        received = []
+        usage = None
+        rejected_before = near_dupes.rejected
+        span = tracing.span('llm.call', kind='stream', attempt=0, requested=num_questions)
+        span.__enter__()
+
+        try:
+            stream_error = None
+            try:
+                for chunk in self.groq.stream(messages, **self._llm_kwargs(num_questions)):
+                    if tracing.enabled():
+                        received.append(str(chunk.content))
+                        usage = getattr(chunk, 'usage_metadata', None) or usage
+                    for item in parser.feed(str(chunk.content)):
+                        question, error = validate_question(item)
+                        if question is None:
+                            print(f"Discarded malformed streamed question: {error}")
+                            continue
+                        if not near_dupes.accept(question):
+                            continue
+                        count += 1
+                        streamed.append(question)
+                        if count == 1:
+                            first_question = time.perf_counter() - start
+                            span.set(time_to_first_question=first_question)
+                            if metrics is not None:
+                                metrics['time_to_first_question'] = first_question
+                        yield question
+                        if count >= num_questions:
+                            break
+                    if count >= num_questions or parser.done:
+                        break
+                self._trace_llm_call(span, 'stream', messages, "".join(received), usage, count)
+            except Exception as e:
+                stream_error = e
+                print(f"Error streaming questions: {str(e)}")
+                self._trace_llm_error(span, 'stream', str(e))
+
+            # Ask again for whatever the stream did not deliver: malformed,
+            # near-duplicate or cut-off questions. The client has already
+            # retried every model if it gave up.
+            if count < num_questions and not isinstance(stream_error, LLMUnavailableError):
+                print(f"Stream delivered {count} of {num_questions} questions "
+                      f"({near_dupes.rejected - rejected_before} near-duplicates skipped)")
+                extra, last_error = self._collect_questions(context, num_questions - count, near_dupes,
+                                                            first_attempt=1)
+                for question in extra:
+                    count += 1
+                    streamed.append(question)
+                    if count == 1 and metrics is not None:
+                        metrics['time_to_first_question'] = time.perf_counter() - start
+                    yield question
+                if count == 0 and stream_error is None:
+                    stream_error = GenerationError(last_error)
+            if count == 0:
+                raise GenerationError(str(stream_error)) from stream_error
+            self._cache_store(context, num_questions, streamed, time.perf_counter() - start)
+        finally:
+            # Closed by hand: the span stays open across yields to the caller
+            span.__exit__(None, None, None)
+            elapsed = time.perf_counter() - start
+            if metrics is not None:
+                metrics['time_to_full_quiz'] = elapsed
+                metrics['questions'] = count
+            first = metrics.get('time_to_first_question') if metrics is not None else None
+            print(f"Streamed {count} questions in {elapsed:.2f}s"
+                  + (f" (first after {first:.2f}s)" if first is not None else ""))
+
+    @staticmethod
+    def _question_key(question: Dict) -> str:
+        return re.sub(r'[^a-z0-9]+', ' ', str(question.get('question', '')).lower()).strip()
+
+    async def _generate_batch(self, context: str, num_questions: int, batch_note: str,
+                              semaphore: asyncio.Semaphore, attempt: int = 0,
+                              errors: Optional[List[Exception]] = None) -> List[Dict]:
+        """Generate one batch; returns whatever parsed (possibly fewer or none), appending failures to errors"""
+        queued = time.perf_counter()
+        async with semaphore:
+            if attempt > 0:
+                tracing.inc('llm_retries_total', kind='batch')
+            messages = self._build_messages(context, num_questions, batch_note)
+            with tracing.span('llm.call', kind='batch', attempt=attempt, requested=num_questions,
+                              queue_seconds=time.perf_counter() - queued) as span:
+                try:
+                    response = await self.groq.ainvoke(messages, **self._llm_kwargs(num_questions))
+                    content = str(response.content)
+                    batch = self._parse_questions(content)[:num_questions]
+                    self._trace_llm_call(span, 'batch', messages, content,
+                                         getattr(response, 'usage_metadata', None), len(batch))
+                    return batch
+                except Exception as e:
+                    print(f"Error generating question batch: {str(e)}")
+                    self._trace_llm_error(span, 'batch', str(e))
+                    if errors is not None:
+                        errors.append(e)
+                    return []
+
+    async def generate_mcqs_async(self, context: str, num_questions: int = 10,
+                                  batch_size: Optional[int] = None,
+                                  max_concurrency: Optional[int] = None,
+                                  near_dupes: Optional[NearDuplicateFilter] = None) -> List[Dict]:
+        """Generate questions as small concurrent batches via ainvoke.
+
+        Results are merged and de-duplicated by question text and by
+        near-duplicate detection. Only the shortfall left by failed, short or
+        duplicate batches is requested again, up to ``max_batch_retries``
+        rounds, and whatever was generated is returned even if the target is
+        not reached. Raises GenerationError if nothing was.
+        """
+        near_dupes = near_dupes or NearDuplicateFilter()
+        cached = self._cache_lookup(context, num_questions, near_dupes)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        batch_size = batch_size or self.batch_size
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        questions: List[Dict] = []
+        seen = set()
+        errors: List[Exception] = []
+        for attempt in range(self.max_batch_retries + 1):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            sizes = [min(batch_size, missing - offset) for offset in range(0, missing, batch_size)]
+            tasks = []
+            for i, size in enumerate(sizes):
+                batch_note = (f"\n\nThis is question set {i + 1} of {len(sizes)} (round {attempt + 1}). "
+                              "Cover different concepts and scenarios from the other sets.")
+                tasks.append(self._generate_batch(context, size, batch_note, semaphore, attempt, errors))
+
+            failed_before = len(errors)
+            for batch in await asyncio.gather(*tasks):
+                self._merge_unique(questions, seen, batch, near_dupes)
+            # The client has already retried every model
+            if any(isinstance(e, LLMUnavailableError) for e in errors[failed_before:]):
+                break
+
+        if not questions:
+            raise GenerationError(str(errors[-1]) if errors else "No question batch could be generated")
+        if len(questions) < num_questions:
+            print(f"Generated {len(questions)} of {num_questions} questions after retries")
+        questions = questions[:num_questions]
+        self._cache_store(context, num_questions, questions, time.perf_counter() - start)
+        return questions
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        # The async Groq client keeps its connection pool on the loop it was first
+        # used from, so every call runs on one long-lived background loop.
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="mcq-generator-loop",
+                                 daemon=True).start()
+            return self._loop
+
+    def generate_mcqs_concurrent(self, context: str, num_questions: int = 10,
+                                 near_dupes: Optional[NearDuplicateFilter] = None) -> List[Dict]:
+        """Blocking wrapper around generate_mcqs_async for synchronous callers"""
+        with tracing.span('generate.concurrent', requested=num_questions) as span:
+            future = asyncio.run_coroutine_threadsafe(
+                self.generate_mcqs_async(context, num_questions, near_dupes=near_dupes), self._get_loop())
+            questions = future.result()
+            span.set(returned=len(questions))
+            return questions
\ No newline at end of file
@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import re
+from json_stream import JsonArrayStreamParser
+
+# A JSON array of objects, as opposed to a stray '[' in surrounding prose
+_ARRAY_START_RE = re.compile(r'\[\s*\{')
+_DECODER = json.JSONDecoder()
+
+
+def extract_items(response_text: str) -> List[Any]:
+    """Pull every complete JSON object out of a model response in one pass.
+
+    Code fences, leading or trailing prose and a truncated final element are
+    all tolerated. A wrapper object such as ``{"questions": [...]}`` is
+    unwrapped.
+    """
+    match = _ARRAY_START_RE.search(response_text)
+    if match:
+        try:
+            # Fast path: a well-formed array, whatever text surrounds it
+            items, _ = _DECODER.raw_decode(response_text, match.start())
+        except ValueError:
+            # Recover every complete element from truncated or broken output
+            items = JsonArrayStreamParser().feed(response_text[match.start():])
+    else:
+        items = JsonArrayStreamParser(require_array=False).feed(response_text)
+
+    unwrapped = []
+    for item in items:
+        if isinstance(item, dict) and 'question' not in item:
+            nested = [value for value in item.values() if isinstance(value, list)]
+            if len(nested) == 1:
+                unwrapped.extend(nested[0])
+                continue
+        unwrapped.append(item)
+    return unwrapped
+
+
+def validate_question(item: Any) -> Tuple[Optional[Dict], Optional[str]]:
+    """Check one item against the MCQ schema.
+
+    Returns ``(question, None)`` with a normalised copy when valid, or
+    ``(None, reason)`` otherwise. A ``correct_answer`` given as a digit
+    string is accepted and converted to int.
+    """
+    if not isinstance(item, dict):
+        return None, "item is not an object"
+
+    question = item.get('question')
+    if not isinstance(question, str) or not question.strip():
+        return None, "missing question text"
+
+    options = item.get('options')
+    if not isinstance(options, list) or len(options) != 4:
+        return None, "options must be a list of exactly 4 entries"
+    if not all(isinstance(option, (str, int, float)) and str(option).strip() for option in options):
+        return None, "options must be non-empty strings"
+
+    correct_answer = item.get('correct_answer')
+    if isinstance(correct_answer, str) and correct_answer.strip().isdigit():
+        correct_answer = int(correct_answer.strip())
+    if isinstance(correct_answer, bool) or not isinstance(correct_answer, int):
+        return None, "correct_answer must be an integer"
+    if not 0 <= correct_answer < 4:
+        return None, "correct_answer out of range"
+
+    explanation = item.get('explanation')
+    if not isinstance(explanation, str) or not explanation.strip():
+        return None, "missing explanation"
+
+    return {
+        **item,
+        'question': question.strip(),
+        'options': [str(option) for option in options],
+        'correct_answer': correct_answer,
+        'explanation': explanation.strip(),
+    }, None
+
+
+def parse_mcq_response(response_text: str) -> Tuple[List[Dict], List[str]]:
+    """Return the valid questions in a response and the reasons the others were rejected"""
+    questions = []
+    errors = []
+    for position, item in enumerate(extract_items(response_text)):
+        question, error = validate_question(item)
+        if question is None:
+            errors.append(f"item {position}: {error}")
+        else:
+            questions.append(question)
+    return questions, errors
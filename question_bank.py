@@ -0,0 +1,249 @@
+"""Persistent bank of pre-generated questions with background refill.
+
+Run ``python question_bank.py --watermark 10`` before a deploy to fill the
+bank offline so the first users are served instantly.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from chunk_cache import chunk_key
+from dedup_index import NearDuplicateFilter, NearDuplicateIndex
+from llm_client import background_calls
+
+load_dotenv()
+
+DEFAULT_BANK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'question_bank.sqlite3')
+
+
+def is_servable(question) -> bool:
+    """True for a well-formed question: text, four options and a valid answer index"""
+    return (
+        isinstance(question, dict)
+        and isinstance(question.get('question'), str)
+        and isinstance(question.get('options'), list) and len(question['options']) == 4
+        and isinstance(question.get('correct_answer'), int)
+        and 0 <= question['correct_answer'] < 4
+    )
+
+
+class QuestionBank:
+    """SQLite store of generated questions per category and source chunk.
+
+    With a ``dedup_index``, questions that are near-duplicates of ones already
+    banked for the category (scope ``bank:<category>``) are not added.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_BANK_PATH, dedup_index: Optional[NearDuplicateIndex] = None):
+        self.db_path = db_path
+        self.dedup_index = dedup_index
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL,
+                chunk_key TEXT NOT NULL,
+                question_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL,
+                UNIQUE (category, question_key)
+            );
+            CREATE INDEX IF NOT EXISTS questions_chunk ON questions (category, chunk_key);
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def question_key(question: Dict) -> str:
+        return ' '.join(''.join(c if c.isalnum() else ' ' for c in question['question'].lower()).split())
+
+    def add(self, category: str, source_chunk_key: str, questions: Iterable[Dict]) -> int:
+        """Add questions generated from one chunk; duplicates are ignored. Returns the number added."""
+        now = time.time()
+        questions = [q for q in questions if is_servable(q)]
+        scope = f"bank:{category}"
+        if self.dedup_index is not None:
+            questions = NearDuplicateFilter(self.dedup_index, [scope]).filter(questions)
+        inserted = []
+        with self._lock:
+            for question in questions:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO questions (category, chunk_key, question_key, payload, created) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (category, source_chunk_key, self.question_key(question),
+                     json.dumps(question, ensure_ascii=False), now))
+                if cursor.rowcount:
+                    inserted.append(question)
+            self._conn.commit()
+        # Only what was actually banked; an ignored exact duplicate is indexed already
+        if self.dedup_index is not None:
+            self.dedup_index.add(inserted, scope)
+        return len(inserted)
+
+    def count(self, category: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM questions WHERE category = ?",
+                                      (category,)).fetchone()[0]
+
+    def counts_by_chunk(self, category: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_key, COUNT(*) FROM questions WHERE category = ? GROUP BY chunk_key",
+                (category,)).fetchall()
+        return dict(rows)
+
+    def remove_chunks(self, category: str, chunk_keys: Iterable[str]) -> int:
+        """Delete the questions generated from the given chunks (e.g. of a deleted document)"""
+        chunk_keys = list(chunk_keys)
+        if not chunk_keys:
+            return 0
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("DELETE FROM questions WHERE category = ? AND chunk_key = ?",
+                                   [(category, key) for key in chunk_keys])
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def draw(self, category: str, num_questions: int, exclude_ids: Iterable[int] = (),
+             chunk_keys: Optional[List[str]] = None) -> List[Tuple[int, Dict]]:
+        """Randomly pick up to num_questions (id, question) pairs not in exclude_ids.
+
+        If chunk_keys is given, only questions generated from those chunks are
+        considered.
+        """
+        sql = "SELECT id, payload FROM questions WHERE category = ?"
+        params: list = [category]
+        exclude_ids = list(exclude_ids)
+        if exclude_ids:
+            sql += f" AND id NOT IN ({','.join('?' * len(exclude_ids))})"
+            params.extend(exclude_ids)
+        if chunk_keys is not None:
+            if not chunk_keys:
+                return []
+            sql += f" AND chunk_key IN ({','.join('?' * len(chunk_keys))})"
+            params.extend(chunk_keys)
+        sql += " ORDER BY RANDOM() LIMIT ?"
+        params.append(num_questions)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+
+class BankRefiller:
+    """Tops up the bank from DocumentProcessor.documents with a pool of worker threads.
+
+    Every chunk of every category is kept at ``watermark`` questions or more;
+    chunks below it get ``batch_size`` fresh questions per pass. A chunk
+    that added nothing for ``max_stalls`` passes in a row (the model keeps
+    failing or only repeats banked questions) is no longer asked for more
+    until the process restarts; a changed document gets new chunk keys.
+    """
+
+    def __init__(self, bank: QuestionBank, doc_processor, mcq_generator,
+                 watermark: int = 5, batch_size: int = 5, workers: int = 2, max_stalls: int = 3):
+        self.bank = bank
+        self.doc_processor = doc_processor
+        self.mcq_generator = mcq_generator
+        self.watermark = watermark
+        self.batch_size = batch_size
+        self.max_stalls = max_stalls
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bank-refill')
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        # (category, chunk key) -> consecutive passes that added no question
+        self._stalls: Dict[Tuple[str, str], int] = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _fill_chunk(self, category: str, chunk: str, key: str):
+        added = 0
+        try:
+            # Low priority: quizzes being generated for users go first
+            with background_calls():
+                questions = self.mcq_generator.generate_mcqs(chunk, self.batch_size, use_cache=False)
+            added = self.bank.add(category, key, questions)
+            print(f"Question bank: added {added} questions for {category}")
+        except Exception as e:
+            print(f"Error refilling question bank for {category}: {e}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard((category, key))
+                if added:
+                    self._stalls.pop((category, key), None)
+                else:
+                    self._stalls[(category, key)] = self._stalls.get((category, key), 0) + 1
+                    if self._stalls[(category, key)] == self.max_stalls:
+                        print(f"Question bank: giving up on a {category} chunk after {self.max_stalls} "
+                              f"passes without new questions")
+
+    def refill(self, categories: Optional[List[str]] = None) -> list:
+        """Schedule generation for every chunk below the watermark; returns the futures"""
+        documents = self.doc_processor.documents
+        futures = []
+        for category in categories or list(documents.keys()):
+            counts = self.bank.counts_by_chunk(category)
+            for chunk in documents.get(category, []):
+                key = chunk_key(chunk)
+                if counts.get(key, 0) >= self.watermark:
+                    continue
+                with self._in_flight_lock:
+                    if (category, key) in self._in_flight:
+                        continue
+                    if self._stalls.get((category, key), 0) >= self.max_stalls:
+                        continue
+                    self._in_flight.add((category, key))
+                futures.append(self.executor.submit(self._fill_chunk, category, chunk, key))
+        return futures
+
+    def start(self, interval: float = 600):
+        """Run refill passes in a daemon thread every interval seconds"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                wait(self.refill())
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name='bank-refill-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm the question bank before a deploy")
+    parser.add_argument('--categories', nargs='*', help='categories to fill (default: all)')
+    parser.add_argument('--watermark', type=int, default=10, help='questions to keep per chunk')
+    parser.add_argument('--batch-size', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--passes', type=int, default=3,
+                        help='refill passes; a pass may fall short when the model repeats itself')
+    parser.add_argument('--db', default=DEFAULT_BANK_PATH)
+    args = parser.parse_args()
+
+    from shared import get_dedup_index, get_document_processor, get_mcq_generator
+
+    bank = QuestionBank(args.db, dedup_index=get_dedup_index())
+    refiller = BankRefiller(bank, get_document_processor(), get_mcq_generator(),
+                            watermark=args.watermark, batch_size=args.batch_size, workers=args.workers)
+    categories = args.categories or get_document_processor().get_available_categories()
+    for _ in range(args.passes):
+        futures = refiller.refill(categories)
+        if not futures:
+            break
+        wait(futures)
+    for category in categories:
+        print(f"{category}: {bank.count(category)} questions banked")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Assemble one quiz for one user: question bank first, live generation for the rest.
+
+Both the Streamlit app and the end-to-end benchmark build quizzes through
+``assemble_quiz`` so the benchmark measures exactly what users get.
+"""
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import time
+from chunk_cache import chunk_key
+from dedup_index import NearDuplicateFilter, NearDuplicateIndex
+from mcq_generator import GenerationError, MCQGenerator
+from question_bank import QuestionBank, is_servable
+
+
+def assemble_quiz(bank: QuestionBank, generator: MCQGenerator, dedup_index: NearDuplicateIndex,
+                  category: str, chunks: List[str], query: str, num_questions: int, served: Set[int],
+                  user_scope: str, stream: bool = False,
+                  on_question: Optional[Callable[[Dict, int], None]] = None
+                  ) -> Tuple[List[Dict], Dict, Optional[str]]:
+    """Build a quiz of num_questions questions from the bank and the model.
+
+    Bank questions from ``chunks`` are drawn first, then anything else in
+    the category; ids already in ``served`` are skipped and new ones added
+    to it. Questions close to one already served under ``user_scope`` are
+    dropped, and only the shortfall is generated from ``chunks``, streamed
+    or in concurrent batches. When live generation is needed,
+    ``on_question(question, number)`` is called for every question as soon
+    as it is available (bank questions first), so a UI can render the quiz
+    while it streams. The quiz is recorded under ``user_scope`` in
+    ``dedup_index``.
+
+    Returns the questions (possibly fewer than asked for), the metrics
+    (``from_bank``, ``time_to_first_question``, ``time_to_full_quiz``) and
+    the GenerationError message, if generation failed.
+    """
+    start = time.perf_counter()
+    # Skip anything close to a question this user has already been served
+    near_dupes = NearDuplicateFilter(dedup_index, [user_scope])
+    drawn = bank.draw(category, num_questions, served, chunk_keys=[chunk_key(c) for c in chunks])
+    served.update(qid for qid, _ in drawn)
+    questions = near_dupes.filter(question for _, question in drawn)
+    if len(questions) < num_questions:
+        drawn = bank.draw(category, num_questions - len(questions), served)
+        served.update(qid for qid, _ in drawn)
+        questions += near_dupes.filter(question for _, question in drawn)
+    missing = num_questions - len(questions)
+    metrics = {'from_bank': len(questions)}
+
+    # Fall back to live generation only for what the bank couldn't supply
+    generation_error = None
+    if missing > 0:
+        # De-duplicate the chunks and trim them to the prompt's token budget
+        context = generator.build_context(chunks, query)
+        if on_question is not None:
+            for number, question in enumerate(questions, 1):
+                on_question(question, number)
+        try:
+            if stream:
+                for question in generator.stream_mcqs(context, missing, metrics, near_dupes=near_dupes):
+                    questions.append(question)
+                    if on_question is not None:
+                        on_question(question, len(questions))
+            else:
+                # Small concurrent batches instead of one long all-or-nothing call
+                generated = generator.generate_mcqs_concurrent(context, missing, near_dupes=near_dupes)
+                questions += generated
+                if on_question is not None:
+                    for offset, question in enumerate(generated):
+                        on_question(question, len(questions) - len(generated) + offset + 1)
+        except GenerationError as e:
+            generation_error = str(e)
+
+    if questions:
+        # Remember what this user was served so later quizzes avoid it
+        dedup_index.add([q for q in questions if is_servable(q)], user_scope)
+    if metrics['from_bank']:
+        metrics['time_to_first_question'] = 0.0
+    metrics['time_to_full_quiz'] = time.perf_counter() - start
+    return questions, metrics, generation_error
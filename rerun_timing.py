@@ -0,0 +1,86 @@
+from typing import Callable, Deque, Dict, List
+from collections import deque
+from contextlib import contextmanager
+import os
+import threading
+import time
+import tracing
+
+# Most recent wall times (seconds) kept per panel
+HISTORY_SIZE = 200
+
+_lock = threading.Lock()
+_timings: Dict[str, Deque[float]] = {}
+_hooks: List[Callable[[str, float], None]] = []
+
+
+def add_timing_hook(hook: Callable[[str, float], None]):
+    """Register hook(panel, seconds) to be called after every timed panel run"""
+    with _lock:
+        _hooks.append(hook)
+
+
+def remove_timing_hook(hook: Callable[[str, float], None]):
+    with _lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+@contextmanager
+def timed_panel(panel: str):
+    """Measure one (re)run of a panel and pass its wall time to the hooks.
+
+    Fragments rerun on their own, so timing each one separately shows which
+    interaction pays for which part of the page.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _timings.setdefault(panel, deque(maxlen=HISTORY_SIZE)).append(elapsed)
+            hooks = list(_hooks)
+        for hook in hooks:
+            try:
+                hook(panel, elapsed)
+            except Exception as e:
+                print(f"Error in rerun timing hook: {e}")
+
+
+def timing_summary() -> Dict[str, Dict[str, float]]:
+    """Run count plus last, median and max wall time in milliseconds per panel"""
+    with _lock:
+        snapshot = {panel: list(times) for panel, times in _timings.items() if times}
+    summary = {}
+    for panel, times in snapshot.items():
+        ordered = sorted(times)
+        summary[panel] = {
+            'runs': len(times),
+            'last_ms': times[-1] * 1000,
+            'p50_ms': ordered[len(ordered) // 2] * 1000,
+            'max_ms': ordered[-1] * 1000,
+        }
+    return summary
+
+
+def reset_timings():
+    with _lock:
+        _timings.clear()
+
+
+def _log_timing(panel: str, seconds: float):
+    print(f"Rerun timing: {panel} took {seconds * 1000:.1f} ms")
+
+
+# RERUN_TIMING_LOG=1 prints every panel run to the server log
+if os.getenv('RERUN_TIMING_LOG', '0') == '1':
+    add_timing_hook(_log_timing)
+
+
+def _export_timing(panel: str, seconds: float):
+    tracing.observe('panel_rerun_seconds', seconds, panel=panel)
+
+
+# Panel timings also feed the Prometheus histogram when tracing is on
+add_timing_hook(_export_timing)
@@ -0,0 +1,158 @@
+from typing import Callable, Dict, List, Optional
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+
+def make_key(*parts) -> str:
+    """Content-address a request from its JSON-serialisable parts"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache of generated question lists.
+
+    Entries are keyed by a hash of the rendered prompt and model parameters
+    and also tagged with a pool key (the same request minus the question
+    count), so a pool of previously generated questions for one context can
+    serve quizzes of any size. Entries expire after ``ttl_seconds``, and the
+    least recently used ones are evicted once the cache holds more than
+    ``max_entries`` rows or ``max_bytes`` of question data.
+
+    Lookups take an optional ``accept`` predicate over the questions found;
+    a rejected entry is not served and is not counted as a hit.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 500, max_bytes: int = 50 * 1024 * 1024,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.pool_hits = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                pool_key TEXT NOT NULL,
+                questions TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                latency REAL NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_pool ON responses (pool_key);
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+        """)
+        self._conn.commit()
+
+    def get(self, key: str, accept: Optional[Callable[[List[Dict]], bool]] = None) -> Optional[List[Dict]]:
+        """Return the cached questions for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT questions, latency FROM responses WHERE key = ? AND created >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+        questions = json.loads(row[0]) if row is not None else None
+        # Checked outside the lock: accept may query another store
+        if questions is not None and accept is not None and not accept(questions):
+            questions = None
+        with self._lock:
+            if questions is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            self.saved_seconds += row[1]
+        return questions
+
+    def sample_pool(self, pool_key: str, num_questions: int,
+                    accept: Optional[Callable[[List[Dict]], bool]] = None) -> Optional[List[Dict]]:
+        """Return a random sample of num_questions distinct cached questions for pool_key, if enough exist"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, questions, latency FROM responses WHERE pool_key = ? AND created >= ?",
+                (pool_key, now - self.ttl_seconds),
+            ).fetchall()
+        pool = {}
+        for _, questions, _ in rows:
+            for question in json.loads(questions):
+                if not isinstance(question, dict):
+                    continue
+                pool.setdefault(str(question.get('question', '')).strip().lower(), question)
+        if len(pool) < num_questions:
+            return None
+        sample = random.sample(list(pool.values()), num_questions)
+        if accept is not None and not accept(sample):
+            return None
+        with self._lock:
+            self._conn.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                   [(now, row[0]) for row in rows])
+            self._conn.commit()
+            self.pool_hits += 1
+            self.saved_seconds += max(row[2] for row in rows)
+        return sample
+
+    def put(self, key: str, pool_key: str, questions: List[Dict], latency: float):
+        """Store questions under key and evict expired / least recently used entries"""
+        payload = json.dumps(questions, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, pool_key, questions, size, latency, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, pool_key, payload, len(payload), latency, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from least recently used, dropping rows until both caps hold
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the current size of the cache"""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.pool_hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'pool_hits': self.pool_hits,
+            'hit_rate': (self.hits + self.pool_hits) / lookups if lookups else 0.0,
+            'saved_seconds': self.saved_seconds,
+            'entries': entries,
+            'bytes': total,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
@@ -0,0 +1,155 @@
+from typing import Dict, List, Tuple
+import heapq
+import math
+import re
+
+# Words that carry no topical signal in the queries main.py builds
+STOP_WORDS = frozenset({
+    'a', 'an', 'the', 'to', 'in', 'on', 'at', 'for', 'of', 'with', 'by', 'similar',
+    'questions', 'about', 'and', 'or', 'but', 'generate', 'create'
+})
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Posting flags
+FLAG_START = 1           # term is the first token of the chunk
+FLAG_FIRST_SENTENCE = 2  # term occurs in the chunk's first sentence
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split it into alphanumeric tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def query_terms(query: str) -> List[str]:
+    """Return the distinct non-stop-word terms of a query, in order"""
+    seen = set()
+    terms = []
+    for token in tokenize(query):
+        if token not in STOP_WORDS and token not in seen:
+            seen.add(token)
+            terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """Inverted index over a list of chunks, scored with BM25.
+
+    Postings, document frequencies and per-posting position flags are built
+    once in the constructor, so a query only touches the postings of its own
+    terms. The start-of-chunk and first-sentence bonuses of the original
+    keyword matcher are kept as ``start_boost`` and ``first_sentence_boost``,
+    scaled by the term's IDF, and documents matching more of the query terms
+    get the same ``(1 + coverage)`` multiplier as before.
+    """
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75,
+                 start_boost: float = 1.5, first_sentence_boost: float = 1.0):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.start_boost = start_boost
+        self.first_sentence_boost = first_sentence_boost
+
+        # term -> list of (doc_id, term_frequency, flags)
+        self.postings: Dict[str, List[Tuple[int, int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        for doc_id, chunk in enumerate(chunks):
+            self._add_document(doc_id, chunk)
+        self._finalize()
+
+    @classmethod
+    def merge(cls, segments: List['BM25Index']) -> 'BM25Index':
+        """One index over the chunks of several segments, without re-tokenizing them.
+
+        Postings are concatenated with shifted doc ids and the corpus-wide
+        statistics (IDF, average length) are recomputed, so scores match an
+        index built from all the chunks at once. Parameters come from the
+        first segment.
+        """
+        first = segments[0]
+        index = cls([], first.k1, first.b, first.start_boost, first.first_sentence_boost)
+        chunks: List[str] = []
+        for segment in segments:
+            offset = len(chunks)
+            chunks.extend(segment.chunks)
+            index.doc_lengths.extend(segment.doc_lengths)
+            for term, postings in segment.postings.items():
+                merged = index.postings.setdefault(term, [])
+                if offset:
+                    merged.extend((doc_id + offset, frequency, flags) for doc_id, frequency, flags in postings)
+                else:
+                    merged.extend(postings)
+        index.chunks = chunks
+        index._finalize()
+        return index
+
+    def _finalize(self):
+        self.num_docs = len(self.doc_lengths)
+        self.avg_doc_length = (sum(self.doc_lengths) / self.num_docs) if self.num_docs else 0.0
+        self.idf = {term: self._idf(len(postings)) for term, postings in self.postings.items()}
+        # The BM25 length normalisation only depends on the document, so precompute it
+        avg_doc_length = self.avg_doc_length or 1.0
+        self._doc_norms = [self.k1 * (1 - self.b + self.b * length / avg_doc_length)
+                           for length in self.doc_lengths]
+
+    def _add_document(self, doc_id: int, chunk: str):
+        tokens = tokenize(chunk)
+        self.doc_lengths.append(len(tokens))
+        if not tokens:
+            return
+
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        first_sentence = set(tokenize(chunk.split('.', 1)[0]))
+
+        for term, frequency in frequencies.items():
+            flags = 0
+            if term == tokens[0]:
+                flags |= FLAG_START
+            if term in first_sentence:
+                flags |= FLAG_FIRST_SENTENCE
+            self.postings.setdefault(term, []).append((doc_id, frequency, flags))
+
+    def _idf(self, document_frequency: int) -> float:
+        return math.log(1 + (self.num_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def document_frequency(self, term: str) -> int:
+        return len(self.postings.get(term, ()))
+
+    def score(self, terms: List[str]) -> Dict[int, float]:
+        """Return BM25 scores for every document matching at least one term"""
+        if not terms or not self.num_docs:
+            return {}
+
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        k1_plus_one = self.k1 + 1
+        doc_norms = self._doc_norms
+
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            start_bonus = idf * self.start_boost
+            sentence_bonus = idf * self.first_sentence_boost
+            for doc_id, frequency, flags in postings:
+                value = idf * frequency * k1_plus_one / (frequency + doc_norms[doc_id])
+                if flags & FLAG_START:
+                    value += start_bonus
+                if flags & FLAG_FIRST_SENTENCE:
+                    value += sentence_bonus
+                scores[doc_id] = scores.get(doc_id, 0.0) + value
+                matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        num_terms = len(terms)
+        for doc_id, count in matched.items():
+            scores[doc_id] *= 1 + count / num_terms
+        return scores
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """Return up to top_k (doc_id, score) pairs for the query, best first"""
+        scores = self.score(query_terms(query))
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
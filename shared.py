@@ -0,0 +1,130 @@
+from typing import Dict, Iterable, Optional
+import os
+import threading
+from document_processor import DocumentProcessor
+from mcq_generator import MCQGenerator
+from chunk_cache import chunk_key
+from question_bank import BankRefiller, QuestionBank
+from history_store import DEFAULT_HISTORY_PATH, HistoryStore
+from dedup_index import DEFAULT_DEDUP_PATH, NearDuplicateIndex
+import tracing
+
+# Process-wide instances shared by every Streamlit session. The corpus is
+# swapped in whole when its watcher picks up a change and the Groq client
+# keeps its own connection pool, so neither needs to be rebuilt per rerun.
+# Anything session specific belongs in st.session_state, not on these objects.
+_lock = threading.Lock()
+_document_processor: Optional[DocumentProcessor] = None
+_mcq_generator: Optional[MCQGenerator] = None
+_question_bank: Optional[QuestionBank] = None
+_bank_refiller: Optional[BankRefiller] = None
+_history_store: Optional[HistoryStore] = None
+_dedup_index: Optional[NearDuplicateIndex] = None
+
+
+def get_document_processor() -> DocumentProcessor:
+    """Return the shared DocumentProcessor, loading the corpus on first use.
+
+    Its sources are re-scanned every CORPUS_WATCH_INTERVAL seconds (default
+    30, 0 to disable) so new, changed and deleted PDFs are picked up live.
+    """
+    global _document_processor
+    if _document_processor is None:
+        with _lock:
+            if _document_processor is None:
+                tracing.start_exporters_from_env()
+                # Optional directory of extra PDFs, one category per sub-folder
+                corpus_dir = os.getenv('PDF_CORPUS_DIR')
+                processor = DocumentProcessor(corpus_dirs=[corpus_dir] if corpus_dir else None)
+                interval = float(os.getenv('CORPUS_WATCH_INTERVAL', 30))
+                if interval > 0:
+                    processor.start_watching(interval, on_change=_on_corpus_change)
+                _document_processor = processor
+    return _document_processor
+
+
+def get_mcq_generator() -> MCQGenerator:
+    """Return the shared MCQGenerator and its pooled LLM client"""
+    global _mcq_generator
+    if _mcq_generator is None:
+        with _lock:
+            if _mcq_generator is None:
+                _mcq_generator = MCQGenerator()
+    return _mcq_generator
+
+
+def get_question_bank() -> QuestionBank:
+    """Return the shared question bank, starting its background refill if enabled.
+
+    Background refill makes model calls for every chunk of the corpus, so it
+    is opt-in: set QUESTION_BANK_REFILL=1 to top the bank up while serving.
+    """
+    global _question_bank, _bank_refiller
+    if _question_bank is None:
+        doc_processor = get_document_processor()
+        mcq_generator = get_mcq_generator()
+        dedup_index = get_dedup_index()
+        with _lock:
+            if _question_bank is None:
+                bank = QuestionBank(dedup_index=dedup_index)
+                # Chunks deleted or changed since the questions were banked, possibly while the app was down
+                corpus = doc_processor.corpus
+                _purge_removed(bank, doc_processor, list(corpus.tombstones.values()) + list(corpus.dropped))
+                if os.getenv('QUESTION_BANK_REFILL', '0') != '0':
+                    _bank_refiller = BankRefiller(
+                        bank, doc_processor, mcq_generator,
+                        watermark=int(os.getenv('QUESTION_BANK_WATERMARK', 5)),
+                    )
+                    _bank_refiller.start()
+                _question_bank = bank
+    return _question_bank
+
+
+def get_history_store() -> HistoryStore:
+    """Return the shared attempt history store (path overridable with HISTORY_DB_PATH)"""
+    global _history_store
+    if _history_store is None:
+        with _lock:
+            if _history_store is None:
+                _history_store = HistoryStore(os.getenv('HISTORY_DB_PATH', DEFAULT_HISTORY_PATH))
+    return _history_store
+
+
+def get_dedup_index() -> NearDuplicateIndex:
+    """Return the shared near-duplicate index of served and banked questions.
+
+    Stored in DEDUP_DB_PATH and capped at DEDUP_MAX_SIGNATURES signatures
+    (default 200000) across all users, oldest evicted first.
+    """
+    global _dedup_index
+    if _dedup_index is None:
+        with _lock:
+            if _dedup_index is None:
+                _dedup_index = NearDuplicateIndex(os.getenv('DEDUP_DB_PATH', DEFAULT_DEDUP_PATH),
+                                                  max_signatures=int(os.getenv('DEDUP_MAX_SIGNATURES', 200000)))
+    return _dedup_index
+
+
+def _purge_removed(bank: QuestionBank, doc_processor: DocumentProcessor, tombstones: Iterable):
+    """Drop banked questions of deleted or changed chunks, except those a live document still has"""
+    for tombstone in tombstones:
+        live = {chunk_key(chunk) for chunk in doc_processor.documents.get(tombstone.category, [])}
+        removed = bank.remove_chunks(tombstone.category, [key for key in tombstone.chunk_keys if key not in live])
+        if removed:
+            print(f"Question bank: removed {removed} questions of {os.path.basename(tombstone.path)} "
+                  f"chunks gone from {tombstone.category}")
+
+
+def _on_corpus_change(changes: Dict):
+    # Runs on the corpus watcher thread; the bank may not exist yet
+    if _question_bank is not None and (changes['removed'] or changes['dropped']):
+        _purge_removed(_question_bank, _document_processor, changes['removed'] + changes['dropped'])
+    if _bank_refiller is not None and changes['categories']:
+        _bank_refiller.refill(changes['categories'])
+
+
+def reload_corpus() -> Dict:
+    """Pick up corpus changes now instead of waiting for the watcher, without blocking active readers"""
+    changes = get_document_processor().reload()
+    _on_corpus_change(changes)
+    return changes
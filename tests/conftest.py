@@ -0,0 +1,29 @@
+"""Tests run against temporary stores and a local stand-in for the model API."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_STORE_DIR = tempfile.mkdtemp(prefix='mcq-tests-')
+os.environ.update(
+    GROQ_API_KEY='test-placeholder',
+    QUESTION_BANK_REFILL='0',
+    CORPUS_WATCH_INTERVAL='0',
+    HISTORY_DB_PATH=os.path.join(_STORE_DIR, 'history.sqlite3'),
+    DEDUP_DB_PATH=os.path.join(_STORE_DIR, 'dedup.sqlite3'),
+)
+
+
+@pytest.fixture(scope='session')
+def llm_server():
+    """Fake chat-completions server the app's shared client talks to"""
+    from benchmarks.fake_llm import FakeChatServer, FakeCompletions
+
+    server = FakeChatServer(FakeCompletions(latency=0.0, tokens_per_sec=100000)).start()
+    os.environ['GROQ_API_BASE'] = server.base_url
+    yield server
+    server.stop()
@@ -0,0 +1,42 @@
+from dedup_index import NearDuplicateFilter, NearDuplicateIndex
+
+
+def _question(text):
+    return {'question': text, 'options': ['a', 'b', 'c', 'd'], 'correct_answer': 0, 'explanation': ''}
+
+
+def _questions(scope_number, count):
+    return [_question(f"Visitor {scope_number} asks question {i} about topic {scope_number * 100 + i} in detail")
+            for i in range(count)]
+
+
+def test_many_scopes_stay_under_the_global_cap(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'dedup.sqlite3'), max_per_scope=50, max_signatures=100)
+    for scope_number in range(60):
+        index.add(_questions(scope_number, 5), f"user:guest-{scope_number}")
+        assert index.count() <= 100
+    assert index.count() == 100
+
+    # The oldest visitors were evicted, the newest are still checked against
+    assert index.count("user:guest-0") == 0
+    assert index.count("user:guest-59") == 5
+    recent = NearDuplicateFilter(index, ["user:guest-59"])
+    assert not recent.accept(_questions(59, 1)[0])
+
+    # Band rows go with their signatures
+    bands = index._conn.execute("SELECT COUNT(DISTINCT signature_id) FROM bands").fetchone()[0]
+    assert bands == 100
+
+    # The count survives a reopen
+    reopened = NearDuplicateIndex(str(tmp_path / 'dedup.sqlite3'), max_per_scope=50, max_signatures=100)
+    assert reopened.count() == 100
+
+
+def test_per_scope_cap(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'dedup.sqlite3'), max_per_scope=3)
+    index.add(_questions(1, 5), "user:alice")
+    index.add(_questions(2, 2), "user:bob")
+    assert index.count("user:alice") == 3
+    assert index.count() == 5
+    index.clear("user:alice")
+    assert index.count() == 2
@@ -0,0 +1,66 @@
+from streamlit.testing.v1 import AppTest
+
+from conftest import ROOT
+
+APP = f"{ROOT}/main.py"
+
+
+def _sidebar_button(app, label):
+    return next(button for button in app.sidebar.button if button.label == label)
+
+
+def test_generated_user_id_survives_reload(llm_server):
+    first = AppTest.from_file(APP, default_timeout=60)
+    first.run()
+    assert not first.exception
+    user_id = first.query_params['user']
+    assert user_id.startswith('guest-')
+    assert first.sidebar.text_input[0].value == user_id
+
+    _sidebar_button(first, "Generate Questions").click().run()
+    assert first.session_state.questions
+    for radio in first.radio:
+        radio.set_value(radio.options[0])
+    next(button for button in first.button if button.label == "Submit All Answers").click().run()
+    assert first.session_state.submitted
+
+    from shared import get_history_store
+    assert get_history_store().attempt_count(user_id) == 1
+
+    # A browser reload starts a new session with the same URL
+    reloaded = AppTest.from_file(APP, default_timeout=60)
+    reloaded.query_params.update(first.query_params)
+    reloaded.run()
+    assert not reloaded.exception
+    assert reloaded.sidebar.text_input[0].value == user_id
+    assert reloaded.query_params['user'] == user_id
+    assert get_history_store().attempt_count(user_id) == 1
+
+
+def test_sessions_without_user_get_their_own_id(llm_server):
+    first = AppTest.from_file(APP, default_timeout=60)
+    first.run()
+    second = AppTest.from_file(APP, default_timeout=60)
+    second.run()
+    assert first.query_params['user'] != second.query_params['user']
+
+
+def test_short_quiz_is_reported_without_an_error(llm_server, monkeypatch):
+    # Every question looks like one this user has already been served
+    from dedup_index import NearDuplicateFilter
+    monkeypatch.setattr(NearDuplicateFilter, 'accept', lambda self, question: False)
+
+    app = AppTest.from_file(APP, default_timeout=60)
+    app.run()
+    app.sidebar.checkbox[0].uncheck().run()
+    _sidebar_button(app, "Generate Questions").click().run()
+    assert not app.exception
+    assert [error.value for error in app.error] and not app.session_state.questions
+
+    monkeypatch.setattr(NearDuplicateFilter, 'accept',
+                        lambda self, question, count=iter(range(10 ** 6)): next(count) % 2 == 0)
+    _sidebar_button(app, "Generate Questions").click().run()
+    questions = app.session_state.questions
+    assert 0 < len(questions) < 10
+    assert [warning.value for warning in app.warning] == [
+        f"Only {len(questions)} of 10 questions could be prepared."]
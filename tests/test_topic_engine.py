@@ -0,0 +1,57 @@
+from retrieval import BM25Index
+from topic_engine import TopicModel, proper_noun_terms, score_quiz
+
+# Small corpus: every chunk says "every", Richard and Mr. Kamalesh are
+# people, and interest, ratio and probability are the real topics
+CHUNKS = [
+    "Every year the bank pays simple interest on deposits. Richard invests in a scheme where interest is paid yearly.",
+    "Compound interest grows faster than simple interest. Every quarter, Richard checks the interest earned.",
+    "Every recipe mixes milk and water in a ratio. The ratio of milk to water is 3:2 in the first jar.",
+    "Mr. Kamalesh mixes two alloys so that every ratio of copper to zinc stays the same ratio.",
+    "A coin is tossed twice. Every outcome has equal probability, so the probability of two heads is 1/4.",
+    "Mr. Kamalesh draws a card. Every card has equal probability; the probability of an ace is 1/13.",
+    "Trains cross a platform at a speed given in km per hour. Every train in the puzzle keeps its speed.",
+    "A car covers 120 km at a constant speed. Every hour of the trip adds 60 km at that speed.",
+    "Pipes fill a cistern; every pipe has its own rate. Kamalesh opens the pipes, the cistern fills.",
+    "Every worker in a team completes work at a rate. Richard and his team complete the work in days.",
+]
+
+
+def test_topics_skip_generic_words_and_names():
+    model = TopicModel(BM25Index(CHUNKS), max_df_ratio=0.5)
+    topics = set(model.topic_chunks)
+    assert {'interest', 'ratio', 'probability', 'speed'} <= topics
+    assert not topics & {'every', 'richard', 'kamalesh'}
+
+
+def test_proper_noun_terms():
+    names = proper_noun_terms(CHUNKS)
+    assert {'richard', 'kamalesh'} <= names
+    # Capitalised only at sentence starts
+    assert not names & {'every', 'compound', 'trains', 'pipes'}
+
+
+def test_min_length_and_document_frequency():
+    model = TopicModel(BM25Index(CHUNKS), max_df_ratio=0.5, min_length=6)
+    topics = set(model.topic_chunks)
+    assert 'ratio' not in topics and 'speed' not in topics
+    assert {'interest', 'probability'} <= topics
+
+    # A term in more than max_df_ratio of the chunks (here 2) does not discriminate
+    index = BM25Index(CHUNKS)
+    model = TopicModel(index, max_df_ratio=0.2)
+    assert model.topic_chunks
+    assert all(len(index.postings[topic]) <= 2 for topic in model.topic_chunks)
+
+
+def test_score_quiz_maps_missed_questions_to_topics():
+    model = TopicModel(BM25Index(CHUNKS), max_df_ratio=0.5)
+    questions = [
+        {'question': "What is the compound interest on a deposit?", 'options': ['a', 'b', 'c', 'd'],
+         'correct_answer': 0, 'explanation': "Interest is added to the principal."},
+        {'question': "What is the probability of two heads?", 'options': ['a', 'b', 'c', 'd'],
+         'correct_answer': 1, 'explanation': "Each toss has probability 1/2."},
+    ]
+    result = score_quiz(questions, {0: 0, 1: 3}, model)
+    assert result['correct'] == 1 and result['percentage'] == 50
+    assert result['weak_areas'] == ['probability']
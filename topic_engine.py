@@ -0,0 +1,143 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import re
+from retrieval import BM25Index, STOP_WORDS, query_terms
+
+# Frequent words that survive the length filter but never name a topic
+_NON_TOPIC_WORDS = frozenset({
+    'what', 'which', 'that', 'this', 'with', 'have', 'from', 'they', 'their', 'there', 'were',
+    'will', 'would', 'should', 'could', 'your', 'when', 'then', 'than', 'them', 'been', 'being',
+    'into', 'more', 'most', 'some', 'such', 'only', 'also', 'each', 'other', 'these', 'those',
+    'does', 'following', 'answer', 'question', 'options', 'given', 'find', 'correct', 'option',
+    'because', 'here', 'where', 'while', 'after', 'before', 'many', 'much', 'very', 'like',
+    # Quantifiers, connectives and number words
+    'every', 'even', 'both', 'same', 'none', 'neither', 'either', 'alone', 'along', 'whole',
+    'another', 'among', 'about', 'above', 'below', 'under', 'over', 'again', 'still', 'just',
+    'always', 'never', 'often', 'already', 'ever', 'least', 'less', 'first', 'last', 'next',
+    'three', 'four', 'five', 'seven', 'eight', 'nine', 'twelve', 'twenty', 'hundred', 'thousand',
+    # Generic verbs, nouns and adjectives
+    'follow', 'follows', 'make', 'made', 'take', 'taken', 'took', 'give', 'know', 'known', 'want',
+    'wants', 'asked', 'help', 'come', 'came', 'goes', 'went', 'said', 'says', 'tell', 'told',
+    'held', 'received', 'talk', 'reach', 'keep', 'kept', 'used', 'using', 'show', 'shown', 'stand',
+    'thing', 'things', 'someone', 'something', 'anyone', 'anything', 'everyone', 'people', 'person',
+    'part', 'place', 'main', 'good', 'best', 'better', 'nice', 'great', 'right', 'wrong', 'true',
+    'false', 'short', 'long', 'week', 'year', 'years', 'past', 'example', 'statement', 'statements',
+    'describe', 'explain', 'choose', 'select',
+})
+
+_WORD_RE = re.compile(r"[A-Za-z]+")
+# A word after any of these starts a sentence, so its capital says nothing about it
+_SENTENCE_BREAKS = frozenset('.!?:;\n\u2022')
+# ...unless it follows one of these, which always precede a name
+_HONORIFICS = frozenset({'mr', 'mrs', 'ms', 'dr', 'miss', 'sir'})
+
+
+def proper_noun_terms(chunks: Iterable[str], min_ratio: float = 0.5) -> Set[str]:
+    """Terms written Capitalised mid-sentence in at least min_ratio of their occurrences.
+
+    Those are names (people, places, brands) rather than concepts. A word
+    after an honorific (Mr., Ms., Dr.) counts as a name however it is
+    written; other sentence and line starts and ALL-CAPS words are not
+    counted either way.
+    """
+    capitalised: Dict[str, int] = {}
+    counted: Dict[str, int] = {}
+    for chunk in chunks:
+        previous_end = None
+        previous = ''
+        for match in _WORD_RE.finditer(chunk):
+            word = match.group()
+            gap = chunk[previous_end:match.start()] if previous_end is not None else '.'
+            after_honorific = previous in _HONORIFICS
+            previous_end, previous = match.end(), word.lower()
+            if not after_honorific and (any(c in _SENTENCE_BREAKS for c in gap)
+                                        or (len(word) > 1 and word.isupper())):
+                continue
+            term = word.lower()
+            counted[term] = counted.get(term, 0) + 1
+            if after_honorific or word[0].isupper():
+                capitalised[term] = capitalised.get(term, 0) + 1
+    return {term for term, count in capitalised.items() if count >= min_ratio * counted[term]}
+
+
+class TopicModel:
+    """Canonical topics for one category, derived from its BM25 index at ingest time.
+
+    A chunk's topics are its highest TF-IDF terms among those shared by at
+    least ``min_df`` chunks (so a topic always groups several chunks) and
+    by no more than ``max_df_ratio`` of them (so it still discriminates).
+    Terms shorter than ``min_length``, generic words and names (terms
+    mostly Capitalised mid-sentence, see proper_noun_terms) are never
+    topics. ``topic_chunks`` maps each topic back to the chunks in its
+    cluster.
+    """
+
+    def __init__(self, index: BM25Index, topics_per_chunk: int = 3, min_df: int = 2,
+                 max_df_ratio: float = 0.3, min_length: int = 4):
+        self.index = index
+        max_df = max(min_df, int(max_df_ratio * index.num_docs))
+        names = proper_noun_terms(index.chunks)
+
+        candidates: List[List[Tuple[float, str]]] = [[] for _ in range(index.num_docs)]
+        for term, postings in index.postings.items():
+            if (len(term) < min_length or not term.isalpha() or term in STOP_WORDS
+                    or term in _NON_TOPIC_WORDS or term in names
+                    or not min_df <= len(postings) <= max_df):
+                continue
+            idf = index.idf[term]
+            for doc_id, frequency, _ in postings:
+                candidates[doc_id].append((frequency * idf, term))
+
+        self.chunk_topics: List[List[str]] = [
+            [term for _, term in heapq.nlargest(topics_per_chunk, terms)] for terms in candidates
+        ]
+        self.topic_chunks: Dict[str, List[int]] = {}
+        for doc_id, topics in enumerate(self.chunk_topics):
+            for topic in topics:
+                self.topic_chunks.setdefault(topic, []).append(doc_id)
+
+    def topics_for_question(self, question: Dict, max_topics: int = 2) -> Tuple[Optional[int], List[str]]:
+        """Map a question to its source chunk and canonical topics with one index lookup.
+
+        Topics named in the question or explanation win (rarest first);
+        otherwise the best-matching chunk's leading topic is used.
+        """
+        text = f"{question.get('question', '')} {question.get('explanation', '')}"
+        results = self.index.search(text, 1)
+        chunk_id = results[0][0] if results else None
+
+        named = [term for term in query_terms(text) if term in self.topic_chunks]
+        named.sort(key=lambda term: (-self.index.idf[term], term))
+        topics = named[:max_topics]
+        if not topics and chunk_id is not None:
+            topics = self.chunk_topics[chunk_id][:1]
+        return chunk_id, topics
+
+
+def build_topic_query(topics: List[str]) -> str:
+    """Retrieval query that targets the given topics"""
+    return "Generate questions about " + " ".join(topics)
+
+
+def score_quiz(questions: List[Dict], answers: Dict[int, int], topic_model: Optional[TopicModel]) -> Dict:
+    """Score a submitted quiz and map every question to its topics, once per submit"""
+    correct_flags = []
+    outcomes = []
+    weak_areas = []
+    for idx, question in enumerate(questions):
+        _, topics = topic_model.topics_for_question(question) if topic_model else (None, [])
+        correct = answers.get(idx) == question['correct_answer']
+        correct_flags.append(correct)
+        outcomes.append((topics, correct))
+        if not correct:
+            weak_areas.extend(topics)
+    total = len(questions)
+    correct_count = sum(correct_flags)
+    return {
+        'correct': correct_count,
+        'total': total,
+        'percentage': (correct_count / total) * 100 if total > 0 else 0,
+        'correct_flags': correct_flags,
+        'outcomes': outcomes,
+        'weak_areas': weak_areas,
+    }
@@ -0,0 +1,353 @@
+"""Lightweight spans, counters and histograms for the hot paths.
+
+Tracing is off unless ``TRACING=1`` (or ``set_enabled(True)``); while off,
+``span()`` returns a shared no-op object and the metric functions return
+immediately, so instrumented code pays one global lookup per call.
+
+Metrics are exported in the Prometheus text format, either over HTTP
+(``METRICS_PORT=9108`` serves ``/metrics`` and recent spans at ``/spans``)
+or to a file rewritten every ``METRICS_FILE_INTERVAL`` seconds
+(``METRICS_FILE=cache/metrics.prom``). ``profile_capture()`` records a
+cProfile (and optionally tracemalloc) snapshot of one block of work.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import cProfile
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+_enabled = os.getenv('TRACING', '0') == '1'
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Finished spans kept for /spans and recent_spans()
+RECENT_SPANS = 500
+
+METRIC_HELP = {
+    'span_duration_seconds': ('histogram', 'Wall time of traced operations'),
+    'span_errors_total': ('counter', 'Traced operations that raised'),
+    'ingest_pages_total': ('counter', 'PDF pages extracted'),
+    'ingest_page_seconds': ('histogram', 'Text extraction time per PDF page'),
+    'ingest_chunks_total': ('counter', 'Chunks produced by ingestion'),
+    'chunk_cache_lookups_total': ('counter', 'Chunk cache lookups by result'),
+    'retrieval_results_total': ('counter', 'Chunks returned by get_relevant_chunks'),
+    'llm_calls_total': ('counter', 'Model calls by kind and outcome'),
+    'llm_retries_total': ('counter', 'Model calls made to replace missing or invalid questions'),
+    'llm_prompt_chars_total': ('counter', 'Characters sent to the model'),
+    'llm_tokens_total': ('counter', 'Model tokens by direction (input tokens are estimated when not reported)'),
+    'llm_questions_total': ('counter', 'Valid questions parsed from model output'),
+    'llm_client_errors_total': ('counter', 'Failed model requests by model and error kind'),
+    'llm_client_retries_total': ('counter', 'Model requests retried after backoff'),
+    'llm_client_hedges_total': ('counter', 'Hedged second requests sent for slow calls'),
+    'llm_client_hedge_wins_total': ('counter', 'Hedged requests that answered first'),
+    'llm_client_fallbacks_total': ('counter', 'Calls handed from a failing model to the next in the chain'),
+    'llm_client_wait_seconds': ('histogram', 'Time spent waiting for a rate-limit token'),
+    'response_cache_lookups_total': ('counter', 'Generated-question cache lookups by result'),
+    'panel_rerun_seconds': ('histogram', 'Streamlit panel rerun wall time'),
+}
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_histograms: Dict[Tuple[str, Tuple], List] = {}
+_recent: deque = deque(maxlen=RECENT_SPANS)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool):
+    global _enabled
+    _enabled = flag
+
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Add value to a counter"""
+    if not _enabled:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    """Record one observation (seconds) in a histogram"""
+    if not _enabled:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(DEFAULT_BUCKETS) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(DEFAULT_BUCKETS, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+class Span:
+    """One timed operation; attributes can be added while it runs with ``set``"""
+
+    __slots__ = ('name', 'attributes', 'parent', 'start', 'duration', 'error', '_token')
+
+    def __init__(self, name: str, attributes: Dict):
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.start = 0.0
+        self.duration = None
+        self.error = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> 'Span':
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Generator spans can be closed from another context
+            pass
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.error = exc_type.__name__
+            inc('span_errors_total', span=self.name)
+        observe('span_duration_seconds', self.duration, span=self.name)
+        with _lock:
+            _recent.append({
+                'name': self.name,
+                'parent': self.parent.name if self.parent is not None else None,
+                'start': time.time() - self.duration,
+                'duration_ms': self.duration * 1000,
+                'error': self.error,
+                'attributes': self.attributes,
+            })
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """Context manager timing a block as a span (a no-op while tracing is off)"""
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def timed_iter(iterable: Iterable, totals: Dict[str, float], key: str = 'seconds') -> Iterator:
+    """Yield from iterable, adding the time spent producing items to totals[key]"""
+    iterator = iter(iterable)
+    totals.setdefault(key, 0.0)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            totals[key] += time.perf_counter() - start
+            return
+        totals[key] += time.perf_counter() - start
+        yield item
+
+
+def recent_spans(limit: int = 100) -> List[Dict]:
+    with _lock:
+        return list(_recent)[-limit:]
+
+
+def _format_labels(labels: Tuple, extra: Tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: [list(value[0]), value[1], value[2]] for key, value in _histograms.items()}
+
+    lines = []
+    described = set()
+
+    def header(name: str, kind: str):
+        if name in described:
+            return
+        described.add(name)
+        help_text = METRIC_HELP.get(name, (kind, name))[1]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, 'counter')
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        header(name, 'histogram')
+        cumulative = 0
+        for bound, bucket in zip(DEFAULT_BUCKETS + (float('inf'),), buckets):
+            cumulative += bucket
+            le = '+Inf' if bound == float('inf') else f"{bound:g}"
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path: str):
+    """Atomically replace path with the current metrics"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.prom')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(render_prometheus())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def reset():
+    """Drop every metric and recorded span"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _recent.clear()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/metrics'):
+            body = render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.startswith('/spans'):
+            body = json.dumps(recent_spans(RECENT_SPANS), default=str).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve /metrics and /spans from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def start_metrics_file_writer(path: str, interval: float = 15.0) -> threading.Thread:
+    """Rewrite path with the current metrics every interval seconds from a daemon thread"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                write_metrics(path)
+            except OSError as e:
+                print(f"Error writing metrics file {path}: {e}")
+
+    thread = threading.Thread(target=loop, name='metrics-file-writer', daemon=True)
+    thread.start()
+    return thread
+
+
+_exporters_started = False
+
+
+def start_exporters_from_env():
+    """Start the exporters selected by METRICS_PORT / METRICS_FILE, once per process"""
+    global _exporters_started
+    with _lock:
+        if _exporters_started or not _enabled:
+            return
+        _exporters_started = True
+    port = os.getenv('METRICS_PORT')
+    if port:
+        try:
+            start_metrics_server(int(port), os.getenv('METRICS_HOST', '127.0.0.1'))
+        except OSError as e:
+            print(f"Error starting metrics server on port {port}: {e}")
+    path = os.getenv('METRICS_FILE')
+    if path:
+        start_metrics_file_writer(path, float(os.getenv('METRICS_FILE_INTERVAL', 15)))
+
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'profiles')
+
+
+@contextmanager
+def profile_capture(name: str, memory: bool = False, profile_dir: str = DEFAULT_PROFILE_DIR):
+    """Profile one block of work with cProfile and, if memory, tracemalloc.
+
+    Writes <name>-<timestamp>.prof (open with ``python -m pstats`` or
+    snakeviz) and, for memory, a .txt of the top allocation sites. The
+    yielded dict is filled with the written paths.
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    stem = os.path.join(profile_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    result = {}
+    started_tracemalloc = memory and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        result['profile'] = stem + '.prof'
+        profiler.dump_stats(result['profile'])
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            result['memory'] = stem + '-memory.txt'
+            with open(result['memory'], 'w', encoding='utf-8') as file:
+                file.write(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB\n")
+                for stat in snapshot.statistics('lineno')[:25]:
+                    file.write(f"{stat}\n")
+        print(f"Profile for {name} written to {', '.join(result.values())}")